@@ -0,0 +1 @@
+"""端到端压测，用法见 bench/run.py"""
@@ -0,0 +1,113 @@
+"""
+没有安装 AstrBot 时使用的最小替身，只提供插件导入时用到的名称。
+
+只在压测中使用：install() 会先尝试导入真实的 astrbot，导入失败才注册替身模块。
+"""
+
+import sys
+import types
+import logging
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+class _Filter:
+    class EventMessageType:
+        ALL = "all"
+
+    class PermissionType:
+        ADMIN = "admin"
+
+    def event_message_type(self, *args, **kwargs):
+        return lambda func: func
+
+    def command(self, *args, **kwargs):
+        return lambda func: func
+
+    def permission_type(self, *args, **kwargs):
+        return lambda func: func
+
+
+class _AstrMessageEvent:
+    """真实事件需要平台适配器，压测统一使用 harness.FakeEvent"""
+
+
+class _MessageEventResult:
+    pass
+
+
+class _MessageChain:
+    pass
+
+
+class _Context:
+    pass
+
+
+class _Star:
+    def __init__(self, context, config=None):
+        self.context = context
+
+    async def html_render(self, tmpl, data, options=None):
+        raise NotImplementedError("压测中由 harness 替换")
+
+
+def _register(*args, **kwargs):
+    return lambda cls: cls
+
+
+class _StarTools:
+    data_dir = "."
+
+    @classmethod
+    def get_data_dir(cls, name=None):
+        return cls.data_dir
+
+
+class _File:
+    def __init__(self, name: str = "", file: str = ""):
+        self.name = name
+        self.file = file
+
+    async def get_file(self):
+        return self.file
+
+
+class _Plain:
+    def __init__(self, text: str = ""):
+        self.text = text
+
+
+class _Image:
+    def __init__(self, file: str = ""):
+        self.file = file
+
+
+def install() -> str:
+    """返回 "astrbot"（真实环境）或 "stub"（已注册替身）"""
+    try:
+        import astrbot.api  # noqa: F401
+        return "astrbot"
+    except ImportError:
+        pass
+
+    _module("astrbot")
+    _module("astrbot.api", logger=logging.getLogger("astrbot"), AstrBotConfig=dict)
+    _module(
+        "astrbot.api.event",
+        filter=_Filter(),
+        AstrMessageEvent=_AstrMessageEvent,
+        MessageEventResult=_MessageEventResult,
+        MessageChain=_MessageChain,
+    )
+    _module("astrbot.api.star", Context=_Context, Star=_Star, register=_register, StarTools=_StarTools)
+    _module("astrbot.api.message_components", File=_File, Plain=_Plain, Image=_Image)
+    return "stub"
@@ -0,0 +1,177 @@
+"""
+压测用的插件装配：加载插件包、伪造事件和上下文、替换文转图与模型调用。
+"""
+
+import json
+import time
+import types
+import asyncio
+import importlib
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+
+from . import fake_astrbot
+from .stub_server import StubUpstream
+
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "astrbot_plugin_gok"
+
+# 回复中出现这些内容视为失败
+FAIL_MARKERS = ("稍后再试", "失败", "错误", "未查询到", "未找到", "未配置")
+STALE_MARKER = "缓存数据"
+
+
+def load_plugin_module():
+    """以 astrbot_plugin_gok 包名导入插件，返回 main 模块"""
+    backend = fake_astrbot.install()
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [str(ROOT)]
+        sys.modules[PACKAGE] = package
+    module = importlib.import_module(f"{PACKAGE}.main")
+    module.ASTRBOT_BACKEND = backend
+    return module
+
+
+class FakeEvent:
+    """模拟群消息事件，记录插件发出的每条回复"""
+
+    def __init__(self, text: str, group: int, admin: bool = False):
+        self.message_str = text
+        self.unified_msg_origin = f"bench:GroupMessage:{group}"
+        self.group = group
+        self.admin = admin
+        self.sent: List[Tuple[float, str, Any]] = []
+        self.stopped = False
+
+    def stop_event(self):
+        self.stopped = True
+
+    def is_admin(self) -> bool:
+        return self.admin
+
+    def get_group_id(self) -> str:
+        return str(self.group)
+
+    def get_messages(self) -> list:
+        return []
+
+    def plain_result(self, text: str):
+        return ("plain", text)
+
+    def image_result(self, url: str):
+        return ("image", url)
+
+    async def send(self, result):
+        kind, payload = result
+        self.sent.append((time.perf_counter(), kind, payload))
+
+    def outcome(self) -> str:
+        """ok / stale / error"""
+        if not self.sent:
+            return "error"
+        texts = [str(p) for _, kind, p in self.sent if kind == "plain"]
+        if any(STALE_MARKER in t for t in texts):
+            return "stale"
+        if any(marker in t for t in texts for marker in FAIL_MARKERS):
+            return "error"
+        return "ok"
+
+
+class _LLMResponse:
+    def __init__(self, text: str):
+        self.completion_text = text
+
+
+class FakeContext:
+    """只实现插件用到的模型接口，延迟可配置"""
+
+    def __init__(self, llm_ms: float = 800):
+        self.llm_ms = llm_ms
+        self.llm_calls = 0
+        self.prompt_chars = 0
+
+    async def get_current_chat_provider_id(self, umo: str = "") -> str:
+        return "bench"
+
+    async def llm_generate(self, chat_provider_id: str = "", prompt: str = "", **kwargs):
+        self.llm_calls += 1
+        self.prompt_chars += len(prompt)
+        await asyncio.sleep(self.llm_ms / 1000)
+        return _LLMResponse("这战绩，建议回炉重造。")
+
+
+def schema_defaults(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """按 _conf_schema.json 生成默认配置"""
+    config = {}
+    for key, item in schema.items():
+        if item.get("type") == "object":
+            config[key] = schema_defaults(item.get("items", {}))
+        else:
+            config[key] = item.get("default")
+    return config
+
+
+def build_config(overrides: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    with open(ROOT / "_conf_schema.json", "r", encoding="utf-8") as f:
+        config = schema_defaults(json.load(f))
+    config["ytapi_token"] = "bench"
+    config["nyapi_token"] = "bench"
+    for section, values in (overrides or {}).items():
+        if isinstance(values, dict):
+            config.setdefault(section, {}).update(values)
+        else:
+            config[section] = values
+    return config
+
+
+def point_to_stub(api_config: Dict[str, Any], stub: StubUpstream):
+    """把接口地址改为本地替身，t1qq 和 nycnm 仍是两个不同的主机"""
+    for api in api_config.values():
+        url = urlparse(api["url"])
+        name = "nycnm" if "nycnm" in url.netloc else "t1qq"
+        base = urlparse(stub.base_url(name))
+        api["url"] = urlunparse(url._replace(scheme=base.scheme, netloc=base.netloc))
+
+
+async def make_plugin(
+    module,
+    stub: StubUpstream,
+    data_dir: Path,
+    config: Dict[str, Any],
+    render_ms: float = 200,
+    llm_ms: float = 800
+):
+    """创建并初始化插件实例，html_render 替换为固定延迟的假实现"""
+    star_tools = sys.modules["astrbot.api.star"].StarTools
+    star_tools.get_data_dir = classmethod(lambda cls, name=None: data_dir)
+
+    context = FakeContext(llm_ms)
+    plugin = module.GokApiPlugin(context, config)
+    point_to_stub(plugin.api_config, stub)
+
+    renders = {"count": 0}
+
+    async def html_render(tmpl, data, options=None, **kwargs):
+        # 真实渲染需要把模板和数据发给渲染服务，这里保留序列化开销
+        json.dumps(data, ensure_ascii=False, default=str)
+        renders["count"] += 1
+        await asyncio.sleep(render_ms / 1000)
+        return f"https://render.local/{renders['count']}.png"
+
+    plugin.html_render = html_render
+    plugin.bench_renders = renders
+    await plugin.initialize()
+    return plugin
+
+
+async def drive(plugin, event: FakeEvent) -> float:
+    """让插件处理一条消息，返回耗时（秒）"""
+    start = time.perf_counter()
+    async for result in plugin.on_all_message(event):
+        if result is not None:
+            await event.send(result)
+    return time.perf_counter() - start
@@ -0,0 +1,236 @@
+"""
+端到端压测
+
+启动本地上游替身，用伪造的群消息驱动 GokApiPlugin.on_all_message，
+统计每个指令在不同并发群数下的 p50/p95/p99 延迟和吞吐量，输出 JSON 报告。
+
+在插件目录下运行（不需要网络，也不需要安装 AstrBot）：
+
+    python -m bench.run
+    python -m bench.run --groups 1 10 100 --requests 20 --latency 80 --error-rate 0.01
+    python -m bench.run --out bench/results/new.json --baseline bench/results/old.json
+
+每个场景（指令 × 并发群数）使用全新的数据目录和插件实例，结果之间互不影响。
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from .stub_server import StubUpstream
+from .harness import ROOT, FakeEvent, build_config, drive, load_plugin_module, make_plugin
+
+
+COMMANDS = ("战绩", "资料", "上榜战力", "功能")
+REGIONS = ("aqq", "awx", "iqq", "iwx")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def message_factory(command: str, players: int, rng: random.Random) -> Callable[[], str]:
+    """按指令生成消息内容，玩家ID从固定大小的池中随机选取"""
+    with open(ROOT / "data" / "heroes.json", "r", encoding="utf-8") as f:
+        heroes = [h["name"] for h in json.load(f)["heroes"]]
+
+    def gokid() -> int:
+        return 10000000 + rng.randrange(players)
+
+    if command == "战绩":
+        return lambda: f"战绩 {gokid()}"
+    if command == "资料":
+        return lambda: f"资料 {gokid()}"
+    if command == "上榜战力":
+        return lambda: f"上榜战力 {rng.choice(heroes)} {rng.choice(REGIONS)}"
+    return lambda: command
+
+
+async def run_scenario(module, stub: StubUpstream, command: str, groups: int, args) -> Dict[str, Any]:
+    """单个场景：groups 个群并发，每个群依次发送 requests 条消息"""
+    rng = random.Random(f"{args.seed}:{command}:{groups}")
+    make_text = message_factory(command, args.players, rng)
+
+    overrides = {
+        "comment": {"enable": args.comment},
+        "ratelimit": {"enable": args.ratelimit},
+        "zhanli_snapshot": {"enable": False},
+        "metrics": {"enable": args.metrics, "prometheus": False},
+    }
+    with tempfile.TemporaryDirectory(prefix="gok-bench-") as tmp:
+        plugin = await make_plugin(
+            module, stub, Path(tmp), build_config(overrides),
+            render_ms=args.render_ms, llm_ms=args.llm_ms
+        )
+        prefix = plugin.prefix_text if plugin.prefix_en else ""
+
+        try:
+            # 预热：建立连接、加载模板
+            for _ in range(args.warmup):
+                await drive(plugin, FakeEvent(prefix + make_text(), 0))
+
+            stub.reset_counts()
+            metrics = sys.modules[f"{module.__package__}.core.metrics"].metrics
+            metrics.reset()
+            latencies: List[float] = []
+            outcomes = {"ok": 0, "stale": 0, "error": 0}
+
+            async def group(gid: int):
+                for _ in range(args.requests):
+                    event = FakeEvent(prefix + make_text(), gid)
+                    try:
+                        latencies.append(await drive(plugin, event))
+                        outcomes[event.outcome()] += 1
+                    except Exception:
+                        outcomes["error"] += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(group(g) for g in range(1, groups + 1)))
+            wall = time.perf_counter() - start
+            stages = {
+                stage: {
+                    "count": hist.count,
+                    "avg_ms": round(hist.sum / hist.count * 1000, 2),
+                    "p95_ms": round(hist.quantile(0.95) * 1000, 2),
+                }
+                for (cmd, stage), hist in metrics.histograms.items() if cmd == command and hist.count
+            }
+        finally:
+            await plugin.terminate()
+
+    ms = [v * 1000 for v in latencies]
+    return {
+        "command": command,
+        "groups": groups,
+        "messages": groups * args.requests,
+        **outcomes,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+        "throughput_rps": round(len(ms) / wall, 2) if wall else 0.0,
+        "wall_s": round(wall, 3),
+        "upstream": dict(stub.counts),
+        "renders": plugin.bench_renders["count"],
+        "stages": stages,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def print_table(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None):
+    base = {(r["command"], r["groups"]): r for r in (baseline or {}).get("results", [])}
+    header = f"{'指令':<8}{'并发':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>10}{'失败':>6}{'兜底':>6}"
+    if base:
+        header += f"{'p95变化':>10}{'rps变化':>10}"
+    print(header)
+    for r in results:
+        line = (
+            f"{r['command']:<8}{r['groups']:>6}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+            f"{r['p99_ms']:>10.1f}{r['throughput_rps']:>10.1f}{r['error']:>6}{r['stale']:>6}"
+        )
+        old = base.get((r["command"], r["groups"]))
+        if old:
+            def delta(new, prev):
+                return f"{(new - prev) / prev * 100:+.1f}%" if prev else "-"
+            line += f"{delta(r['p95_ms'], old['p95_ms']):>10}{delta(r['throughput_rps'], old['throughput_rps']):>10}"
+        print(line)
+
+
+async def main(args) -> Dict[str, Any]:
+    module = load_plugin_module()
+    stub = StubUpstream(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        image_kb=args.image_kb, seed=args.seed
+    )
+    await stub.start()
+    try:
+        results = []
+        for command in args.commands:
+            for groups in args.groups:
+                result = await run_scenario(module, stub, command, groups, args)
+                results.append(result)
+                print(
+                    f"{command} × {groups}: p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                    f"rps={result['throughput_rps']}", file=sys.stderr
+                )
+    finally:
+        await stub.stop()
+
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "astrbot": module.ASTRBOT_BACKEND,
+            "options": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "verbose")},
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GOK 插件端到端压测")
+    parser.add_argument("--commands", nargs="+", default=list(COMMANDS), choices=COMMANDS)
+    parser.add_argument("--groups", nargs="+", type=int, default=[1, 10, 100], help="并发群数")
+    parser.add_argument("--requests", type=int, default=10, help="每个群发送的消息数")
+    parser.add_argument("--warmup", type=int, default=3, help="每个场景预热消息数，不计入结果")
+    parser.add_argument("--players", type=int, default=200, help="玩家ID池大小，越小缓存命中越多")
+    parser.add_argument("--latency", type=float, default=80, help="上游平均延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=40, help="上游延迟浮动（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="上游返回 500 的概率")
+    parser.add_argument("--image-kb", type=int, default=150, help="资料图片大小（KB）")
+    parser.add_argument("--render-ms", type=float, default=200, help="文转图耗时（毫秒）")
+    parser.add_argument("--llm-ms", type=float, default=800, help="锐评模型耗时（毫秒）")
+    parser.add_argument("--comment", action="store_true", help="启用战绩锐评")
+    parser.add_argument("--ratelimit", action="store_true", help="启用接口限流（默认关闭，以测量插件本身）")
+    parser.add_argument("--metrics", action="store_true", help="启用性能统计，报告中附带各阶段耗时")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, help="报告输出路径，默认 bench/results/<时间>.json")
+    parser.add_argument("--baseline", type=Path, help="对比的旧报告")
+    parser.add_argument("--verbose", action="store_true", help="输出插件日志")
+    return parser.parse_args(argv)
+
+
+def cli(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    logging.getLogger("astrbot").setLevel(logging.INFO if args.verbose else logging.ERROR)
+
+    report = asyncio.run(main(args))
+
+    out = args.out or ROOT / "bench" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+    print_table(report["results"], baseline)
+    print(f"\n报告已保存：{out}")
+
+
+if __name__ == "__main__":
+    cli()
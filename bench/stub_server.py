@@ -0,0 +1,177 @@
+"""
+本地上游替身：模拟 t1qq（morebattle / ydtp）和 nycnm（wzzl.php）接口。
+
+两个上游分别监听不同端口，插件的限流和熔断仍按主机区分。
+延迟和错误率可配置，并按路径统计请求次数。
+"""
+
+import time
+import random
+import asyncio
+import hashlib
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+from aiohttp import web
+
+
+MOREBATTLE = "/api/tool/wzrr/morebattle"
+YDTP = "/api/tool/wzrr/ydtp"
+WZZL = "/API/wzzl.php"
+
+MAPS = ["王者峡谷", "排位赛", "巅峰赛", "娱乐模式"]
+JOBS = ["坦克", "战士", "刺客", "法师", "射手", "辅助"]
+
+
+def _battle(rng: random.Random, gametime: float) -> Dict:
+    """一局对局数据，字段与 morebattle 返回的一致，附带部分未使用的字段"""
+    win = rng.random() < 0.52
+    mvp = rng.random() < 0.2
+    used = rng.randint(480, 1500)
+    return {
+        "gametime": datetime.fromtimestamp(gametime).strftime("%Y-%m-%d %H:%M:%S"),
+        "killcnt": rng.randint(0, 18),
+        "deadcnt": rng.randint(0, 12),
+        "assistcnt": rng.randint(0, 25),
+        "gameresult": 1 if win else 2,
+        "mvpcnt": int(win and mvp),
+        "losemvp": int(not win and mvp),
+        "mapName": rng.choice(MAPS),
+        "oldMasterMatchScore": 1500,
+        "newMasterMatchScore": 1512 if win else 1490,
+        "usedTime": used,
+        "winNum": rng.randint(0, 5),
+        "failNum": rng.randint(0, 5),
+        "roleJobName": rng.choice(JOBS),
+        "stars": rng.randint(0, 5),
+        "desc": "",
+        "gradeGame": f"{rng.uniform(3, 16):.1f}",
+        "heroIcon": f"https://game.gtimg.cn/images/yxzj/img201606/heroimg/{rng.randint(105, 600)}/{rng.randint(105, 600)}.jpg",
+        "godLikeCnt": rng.randint(0, 2),
+        "firstBlood": rng.randint(0, 1),
+        "hero1TripleKillCnt": rng.randint(0, 1),
+        "hero1UltraKillCnt": 0,
+        "hero1RampageCnt": 0,
+        "evaluateUrlV3": "https://camp.qq.com/evaluate.png",
+        "mvpUrlV3": "https://camp.qq.com/mvp.png" if mvp else "",
+        "heroId": rng.randint(105, 600),
+        "gameSeq": rng.randint(10 ** 9, 10 ** 10),
+        "battleType": rng.randint(1, 30),
+        "detailUrl": "https://camp.qq.com/battle/detail",
+    }
+
+
+class StubUpstream:
+    """
+    :param latency: 平均延迟（毫秒）
+    :param jitter: 延迟随机浮动（毫秒）
+    :param error_rate: 返回 500 的概率
+    :param image_kb: ydtp 返回的图片大小
+    :param battle_interval: 每个角色每隔多少秒产生一局新对局
+    """
+
+    def __init__(
+        self,
+        latency: float = 80,
+        jitter: float = 40,
+        error_rate: float = 0.0,
+        image_kb: int = 150,
+        battle_interval: float = 600,
+        seed: int = 0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.image_kb = image_kb
+        self.battle_interval = battle_interval
+        self.rng = random.Random(seed)
+        self.counts: Counter = Counter()
+        self.ports: Dict[str, int] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str = "127.0.0.1"):
+        app = web.Application()
+        app.router.add_get(MOREBATTLE, self.morebattle)
+        app.router.add_get(YDTP, self.ydtp)
+        app.router.add_get(WZZL, self.wzzl)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+
+        # 端口 0 由系统分配，两个站点模拟两个上游主机
+        for name in ("t1qq", "nycnm"):
+            site = web.TCPSite(self._runner, host, 0)
+            await site.start()
+            self.ports[name] = site._server.sockets[0].getsockname()[1]
+        self.host = host
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def base_url(self, name: str) -> str:
+        return f"http://{self.host}:{self.ports[name]}"
+
+    def reset_counts(self):
+        self.counts.clear()
+
+    async def _delay(self, path: str) -> Optional[web.Response]:
+        """模拟网络延迟，按错误率返回 500"""
+        self.counts[path] += 1
+        delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)) / 1000
+        await asyncio.sleep(delay)
+        if self.rng.random() < self.error_rate:
+            self.counts[f"{path} 500"] += 1
+            return web.Response(status=500, text="stub error")
+        return None
+
+    async def morebattle(self, request: web.Request) -> web.Response:
+        error = await self._delay(MOREBATTLE)
+        if error:
+            return error
+
+        gokid = request.query.get("id", "0")
+        option = request.query.get("option", "0")
+        # 最新一局的时间按间隔推进，模拟玩家持续产生新对局
+        latest = time.time() // self.battle_interval * self.battle_interval
+        rng = random.Random(f"{gokid}:{option}:{latest}")
+        battles = [_battle(rng, latest - i * 1800) for i in range(25)]
+        return web.json_response({"code": 200, "msg": "success", "data": {"list": battles}})
+
+    async def ydtp(self, request: web.Request) -> web.Response:
+        error = await self._delay(YDTP)
+        if error:
+            return error
+
+        gokid = request.query.get("id", "0")
+        etag = '"' + hashlib.md5(gokid.encode()).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            self.counts[f"{YDTP} 304"] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+
+        body = b"\xff\xd8\xff\xe0" + random.Random(gokid).randbytes(self.image_kb * 1024) + b"\xff\xd9"
+        return web.Response(
+            body=body,
+            content_type="image/jpeg",
+            headers={"ETag": etag, "Last-Modified": "Fri, 16 Oct 2026 00:00:00 GMT"}
+        )
+
+    async def wzzl(self, request: web.Request) -> web.Response:
+        error = await self._delay(WZZL)
+        if error:
+            return error
+
+        hero = request.query.get("hero", "")
+        rng = random.Random(f"{hero}:{request.query.get('type')}")
+        info = {
+            "name": hero,
+            "province": "广东省",
+            "provincePower": str(rng.randint(6000, 14000)),
+            "city": "深圳市",
+            "cityPower": str(rng.randint(4000, 9000)),
+            "area": "南山区",
+            "areaPower": str(rng.randint(2000, 6000)),
+            "updatetime": datetime.now().strftime("%Y-%m-%d"),
+        }
+        return web.json_response({"code": 200, "msg": "success", "data": {"info": info}})
@@ -0,0 +1,112 @@
+import time
+import random
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from astrbot.api import logger
+
+
+class CircuitOpenError(Exception):
+    """上游主机熔断中，直接失败"""
+
+
+@dataclass
+class RetryPolicy:
+    """
+    重试策略（单位：秒）
+
+    retries: 失败后最多重试次数，只对幂等的 GET 生效
+    backoff_base / backoff_max: 指数退避的基数和上限，实际等待在 [0, 上限] 内随机（full jitter）
+    attempt_timeout: 单次请求超时
+    deadline: 包括所有重试在内的总时限
+    """
+    retries: int = 2
+    backoff_base: float = 0.3
+    backoff_max: float = 2.0
+    attempt_timeout: float = 4.0
+    deadline: float = 10.0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    单个上游主机的熔断器
+
+    closed：正常放行，连续失败 threshold 次后进入 open。
+    open：直接失败，cooldown 秒后进入 half_open。
+    half_open：只放行一个探测请求，成功恢复 closed，失败重新 open。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, host: str, threshold: int = 5, cooldown: float = 30.0):
+        self.host = host
+        self.threshold = max(1, int(threshold))
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "opens": 0,
+            "fast_fails": 0,
+        }
+
+    def allow(self):
+        """检查是否放行，不放行时抛出 CircuitOpenError"""
+        if self.state == self.CLOSED:
+            return
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown:
+                self._stats["fast_fails"] += 1
+                raise CircuitOpenError(f"{self.host} 熔断中")
+            self.state = self.HALF_OPEN
+            self._probing = False
+            logger.info(f"熔断器半开，开始探测: {self.host}")
+
+        # half_open：同一时间只放行一个探测请求
+        if self._probing:
+            self._stats["fast_fails"] += 1
+            raise CircuitOpenError(f"{self.host} 熔断探测中")
+        self._probing = True
+
+    def record_success(self):
+        self._stats["successes"] += 1
+        self._failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            logger.info(f"熔断器恢复: {self.host}")
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        self._stats["failures"] += 1
+        self._failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+            if self.state != self.OPEN:
+                self._stats["opens"] += 1
+                logger.warning(f"上游连续失败 {self._failures} 次，熔断 {self.cooldown:.0f}s: {self.host}")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self):
+        """请求未得出结果（被取消或限流）时释放探测名额"""
+        self._probing = False
+
+    def record_retry(self):
+        self._stats["retries"] += 1
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "state": self.state, "consecutive_failures": self._failures}
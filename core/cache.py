@@ -0,0 +1,323 @@
+# pyright: reportOptionalMemberAccess=false
+
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+from urllib.parse import urlencode
+
+from astrbot.api import logger
+
+from .sqlite import AsyncSQLiteDB
+
+
+# 不参与缓存键计算的参数（令牌类）
+TOKEN_PARAMS = ("key", "apikey", "token")
+
+
+@dataclass
+class CachePolicy:
+    """
+    单个接口的缓存策略（单位：秒）
+
+    ttl: 新鲜期，期内直接命中
+    stale: 过期后仍可直接返回旧数据并后台刷新的窗口
+    stale_if_error: 上游不可用时仍可兜底返回旧数据的窗口
+    """
+    ttl: float = 60
+    stale: float = 300
+    stale_if_error: float = 86400
+
+
+@dataclass
+class CacheEntry:
+    endpoint: str
+    value: Any
+    fetched_at: float
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class ResponseCache:
+    """
+    接口响应缓存
+
+    1. 内存 LRU，按接口配置不同的 TTL。
+    2. 可选 SQLite 持久化，插件重载后热数据不丢失。写入和淘汰延后批量落库，不占用请求耗时。
+    3. stale-while-revalidate：过期数据先返回，后台刷新（可使用单独的后台优先级加载函数）。
+    4. 上游不可用时返回旧数据，并通过 meta["as_of"] 标记数据时间。
+    """
+
+    TABLE = "api_cache"
+    # 持久化写入延迟（秒），期间的写入和淘汰合并为一次事务
+    FLUSH_DELAY = 2.0
+
+    def __init__(self, max_entries: int = 512, sqlite: Optional[AsyncSQLiteDB] = None):
+        self.max_entries = max(1, int(max_entries))
+        self._sql_db = sqlite
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._policies: Dict[str, CachePolicy] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        # 待持久化的条目和待删除的键
+        self._dirty: Dict[str, CacheEntry] = {}
+        self._deleted: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "refreshes": 0,
+            "stale_on_error": 0,
+            "flushes": 0,
+        }
+
+    # ======================
+    # 生命周期
+    # ======================
+
+    async def load(self):
+        """建表并加载持久化的缓存条目"""
+        if not self._sql_db:
+            return
+
+        await self._sql_db.execute(f"""
+        CREATE TABLE IF NOT EXISTS {self.TABLE}(
+            key TEXT PRIMARY KEY,
+            endpoint TEXT,
+            value BLOB,
+            is_bytes INTEGER,
+            fetched_at REAL
+        )
+        """)
+
+        # 清理超出兜底窗口的旧数据
+        max_window = max([p.stale_if_error for p in self._policies.values()] or [CachePolicy().stale_if_error])
+        await self._sql_db.execute(
+            f"DELETE FROM {self.TABLE} WHERE fetched_at < ?",
+            (time.time() - max_window,)
+        )
+        # 只保留最新的 max_entries 条，与内存容量一致
+        await self._sql_db.execute(
+            f"DELETE FROM {self.TABLE} WHERE key NOT IN "
+            f"(SELECT key FROM {self.TABLE} ORDER BY fetched_at DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+
+        rows = await self._sql_db.fetch_all(
+            f"SELECT * FROM {self.TABLE} ORDER BY fetched_at DESC LIMIT ?",
+            (self.max_entries,)
+        )
+        # 按时间从旧到新放入，保证最新的数据处于 LRU 尾部
+        for row in reversed(rows):
+            try:
+                value = row["value"] if row["is_bytes"] else json.loads(row["value"])
+            except Exception:
+                continue
+            self._entries[row["key"]] = CacheEntry(row["endpoint"], value, row["fetched_at"])
+
+        logger.info(f"接口缓存已加载 {len(self._entries)} 条持久化数据")
+
+    async def close(self):
+        """取消仍在进行的后台刷新，写入尚未持久化的条目"""
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        if self._refreshing:
+            await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+        self._refreshing.clear()
+
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        self._flush_task = None
+        await self.flush()
+        logger.info(f"接口缓存统计: {self.stats()}")
+
+    # ======================
+    # 策略与键
+    # ======================
+
+    def set_policy(self, endpoint: str, policy: CachePolicy):
+        self._policies[endpoint] = policy
+
+    def policy(self, endpoint: str) -> CachePolicy:
+        return self._policies.get(endpoint) or CachePolicy()
+
+    @staticmethod
+    def make_key(endpoint: str, params: Optional[Dict[str, Any]], exclude: Iterable[str] = TOKEN_PARAMS) -> str:
+        """接口名 + 规范化参数（去除令牌，按键排序）"""
+        items = sorted(
+            (str(k), str(v).strip())
+            for k, v in (params or {}).items()
+            if k not in exclude
+        )
+        return f"{endpoint}?{urlencode(items)}"
+
+    # ======================
+    # 读写
+    # ======================
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        """读取条目但不调整 LRU 顺序"""
+        return self._entries.get(key)
+
+    async def set(self, key: str, endpoint: str, value: Any):
+        entry = CacheEntry(endpoint, value, time.time())
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+            self._mark_deleted(evicted)
+
+        if self._sql_db:
+            self._deleted.discard(key)
+            self._dirty[key] = entry
+            self._schedule_flush()
+
+    def invalidate(self, key: str):
+        if self._entries.pop(key, None) is not None:
+            self._mark_deleted(key)
+            self._schedule_flush()
+
+    # ======================
+    # 持久化
+    # ======================
+
+    def _mark_deleted(self, key: str):
+        if self._sql_db:
+            self._dirty.pop(key, None)
+            self._deleted.add(key)
+
+    def _schedule_flush(self):
+        if self._sql_db and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        while self._dirty or self._deleted:
+            await asyncio.sleep(self.FLUSH_DELAY)
+            await self.flush()
+
+    async def flush(self):
+        """把待写入和待删除的条目一次性写入数据库"""
+        if not self._sql_db or not (self._dirty or self._deleted):
+            return
+        dirty, self._dirty = self._dirty, {}
+        deleted, self._deleted = self._deleted, set()
+
+        rows = []
+        for key, entry in dirty.items():
+            try:
+                is_bytes = isinstance(entry.value, (bytes, bytearray))
+                raw = bytes(entry.value) if is_bytes else json.dumps(entry.value, ensure_ascii=False)
+            except Exception as e:
+                logger.warning(f"缓存持久化失败 ({key}): {e}")
+                continue
+            rows.append((key, entry.endpoint, raw, int(is_bytes), entry.fetched_at))
+
+        try:
+            async with self._sql_db.transaction():
+                if rows:
+                    await self._sql_db.executemany(
+                        f"INSERT OR REPLACE INTO {self.TABLE} (key, endpoint, value, is_bytes, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                        rows
+                    )
+                if deleted:
+                    await self._sql_db.executemany(
+                        f"DELETE FROM {self.TABLE} WHERE key=?", [(key,) for key in deleted]
+                    )
+            self._stats["flushes"] += 1
+        except Exception as e:
+            logger.warning(f"缓存持久化失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["stale_hits"] + self._stats["misses"]
+        hit_rate = (self._stats["hits"] + self._stats["stale_hits"]) / lookups if lookups else 0.0
+        return {**self._stats, "size": len(self._entries), "hit_rate": round(hit_rate, 4)}
+
+    # ======================
+    # 读穿透
+    # ======================
+
+    async def fetch(
+        self,
+        key: str,
+        endpoint: str,
+        loader: Callable[[], Awaitable[Any]],
+        meta: Optional[Dict[str, Any]] = None,
+        refresh: bool = False,
+        background_loader: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Any:
+        """
+        按策略读取缓存，未命中时调用 loader 获取并写入。
+
+        :param loader: 实际请求上游的协程函数，返回空值视为失败。
+        :param meta: 可选的输出字典，兜底返回旧数据时写入 as_of（数据获取时间戳）。
+        :param refresh: 为 True 时不读缓存，直接请求上游并写入（用于预取）。
+        :param background_loader: 过期数据后台刷新时使用的加载函数（如后台优先级），为空时使用 loader。
+        """
+        if refresh:
+            data = await loader()
+            if data:
+                await self.set(key, endpoint, data)
+                self._stats["refreshes"] += 1
+            return data
+
+        policy = self.policy(endpoint)
+        entry = self.get(key)
+
+        if entry is not None:
+            age = entry.age
+            if age <= policy.ttl:
+                self._stats["hits"] += 1
+                return entry.value
+            if age <= policy.ttl + policy.stale:
+                self._stats["stale_hits"] += 1
+                self._refresh_in_background(key, endpoint, background_loader or loader)
+                return entry.value
+
+        self._stats["misses"] += 1
+        data = await loader()
+        if data:
+            await self.set(key, endpoint, data)
+            return data
+
+        # 上游失败，尝试兜底
+        if entry is not None and entry.age <= policy.stale_if_error:
+            self._stats["stale_on_error"] += 1
+            logger.warning(f"上游不可用，返回缓存数据: {key}")
+            if meta is not None:
+                meta["as_of"] = entry.fetched_at
+            return entry.value
+
+        return data
+
+    def _refresh_in_background(self, key: str, endpoint: str, loader: Callable[[], Awaitable[Any]]):
+        """同一个键同时只允许一个后台刷新"""
+        if key in self._refreshing:
+            return
+
+        async def _refresh():
+            try:
+                data = await loader()
+                if data:
+                    await self.set(key, endpoint, data)
+                    self._stats["refreshes"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"缓存后台刷新失败 ({key}): {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(_refresh())
@@ -0,0 +1,179 @@
+import time
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from astrbot.api import logger
+
+from .sqlite import AsyncSQLiteDB
+
+
+# 提示词格式变化时递增，旧缓存自动失效
+PROMPT_VERSION = 2
+
+# 表头，与 encode_rows 的列顺序一致
+TABLE_HEADER = "时间,击杀,死亡,助攻,结果,MVP,评分"
+
+RESULTS = {1: "胜", 2: "负", 3: "平"}
+
+
+def _int(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def encode_rows(rows: List[Dict[str, Any]]) -> str:
+    """
+    对局列表编码为紧凑表格：表头一行，每局一行逗号分隔
+
+    时间只保留 月-日 时:分，结果写成 胜/负/平，MVP 列为 胜（胜方MVP）/ 败（败方MVP）/ 空。
+    """
+    lines = [TABLE_HEADER]
+    for row in rows:
+        gametime = str(row.get("gametime") or "")
+        mvp = "胜" if _int(row.get("mvpcnt")) else "败" if _int(row.get("losemvp")) else ""
+        grade = row.get("gradeGame")
+        lines.append(",".join((
+            gametime[5:16] if len(gametime) >= 16 else gametime,
+            str(_int(row.get("killcnt"))),
+            str(_int(row.get("deadcnt"))),
+            str(_int(row.get("assistcnt"))),
+            RESULTS.get(_int(row.get("gameresult")), "?"),
+            mvp,
+            "" if grade in (None, "") else str(grade),
+        )))
+    return "\n".join(lines)
+
+
+def build_prompt(rows: List[Dict[str, Any]]) -> str:
+    """锐评提示词"""
+    return (
+        f"请根据下面王者荣耀最近{len(rows)}局战绩（按时间倒序，评分满分16），用简短的一句话进行锐评吐槽。\n"
+        f"{encode_rows(rows)}"
+    )
+
+
+def legacy_prompt(rows: List[Dict[str, Any]]) -> str:
+    """旧版提示词（直接拼接字典列表），只用于对比提示词长度"""
+    prompt = "请根据下面提供的王者荣耀最近10把的战绩数据，用简短的一句话进行锐评吐槽。"
+    prompt += f"这是战绩列表\n{rows}\n"
+    prompt += "gametime 字段 对局开始时间\n"
+    prompt += "killcnt 字段 击杀数\n"
+    prompt += "deadcnt 字段 死亡数\n"
+    prompt += "assistcnt 字段 助攻数\n"
+    prompt += "gameresult 字段 1代表胜利 2代表失败 3代表平局\n"
+    prompt += "mvpcnt 字段 1代表是胜利方MVP 0表示不是\n"
+    prompt += "losemvp 字段 1代表是失败方MVP 0表示不是\n"
+    prompt += "gradeGame 字段 系统给的评分，满分16分\n"
+    return prompt
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文等非 ASCII 字符每个计 1 个，ASCII 字符每 4 个计 1 个"""
+    wide = sum(1 for c in text if ord(c) > 127)
+    return wide + (len(text) - wide + 3) // 4
+
+
+def digest(provider_id: str, rows: List[Dict[str, Any]]) -> str:
+    """锐评缓存键：模型 + 提示词版本 + 对局摘要"""
+    h = hashlib.sha256()
+    h.update(f"{PROMPT_VERSION}\n{provider_id}\n".encode("utf-8"))
+    h.update(encode_rows(rows).encode("utf-8"))
+    return h.hexdigest()
+
+
+class CommentCache:
+    """
+    锐评结果缓存
+
+    以对局摘要的哈希为键保存在 comment_cache 表，玩家没有新对局时直接复用上一次的锐评。
+    同一个键同时只调用一次模型，并发的相同查询等待同一个结果。
+    """
+
+    def __init__(self, sqlite: AsyncSQLiteDB, ttl: float = 72 * 3600):
+        self._sql_db = sqlite
+        self.ttl = ttl
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "shared": 0,
+        }
+
+    async def prune(self):
+        """清理过期的锐评"""
+        if self.ttl:
+            await self._sql_db.execute(
+                "DELETE FROM comment_cache WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+
+    async def get(self, key: str) -> Optional[str]:
+        row = await self._sql_db.fetch_one(
+            "SELECT comment, created_at FROM comment_cache WHERE digest=?", (key,)
+        )
+        if row is None or (self.ttl and time.time() - row["created_at"] > self.ttl):
+            return None
+        return row["comment"]
+
+    async def set(self, key: str, comment: str):
+        await self._sql_db.execute(
+            "INSERT OR REPLACE INTO comment_cache (digest, comment, created_at) VALUES (?, ?, ?)",
+            (key, comment, time.time())
+        )
+
+    async def fetch(self, key: str, loader: Callable[[], Awaitable[str]]) -> str:
+        """读取缓存，未命中时调用 loader 生成并写入"""
+        pending = self._pending.get(key)
+        while pending is not None:
+            self._stats["shared"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # 只有领头任务被取消时才重试，自身被取消照常抛出
+                if not pending.cancelled():
+                    raise
+            # 领头任务已清除登记，第一个醒来的等待者接手生成，其余继续等待它
+            self._stats["shared"] -= 1
+            pending = self._pending.get(key)
+
+        # 先登记再查库，查库期间到达的相同查询直接等待这里的结果
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            try:
+                cached = await self.get(key)
+            except Exception as e:
+                logger.warning(f"读取锐评缓存失败: {e}")
+                cached = None
+            if cached:
+                self._stats["hits"] += 1
+                future.set_result(cached)
+                return cached
+
+            self._stats["misses"] += 1
+            comment = await loader()
+            if comment:
+                try:
+                    await self.set(key, comment)
+                except Exception as e:
+                    logger.warning(f"写入锐评缓存失败: {e}")
+            future.set_result(comment)
+            return comment
+        except asyncio.CancelledError:
+            # 登记在 finally 中清除，等待者醒来时会重新发起
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["shared"]
+        reused = self._stats["hits"] + self._stats["shared"]
+        return {**self._stats, "hit_rate": round(reused / lookups, 4) if lookups else 0.0}
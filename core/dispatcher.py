@@ -0,0 +1,145 @@
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# 参数绑定步骤类型
+_EVENT = 0
+_ARG = 1
+_VARARGS = 2
+
+_EMPTY = inspect.Parameter.empty
+
+
+class ArgBinder:
+    """
+    指令参数绑定器
+
+    注册时解析一次处理函数签名，生成 (类型, 名称, 转换函数, 默认值) 元组，
+    调用时只按元组顺序绑定，不再做反射。
+    """
+
+    def __init__(self, handler: Callable):
+        self.handler = handler
+        self.steps: List[Tuple[int, str, Optional[Callable], Any]] = []
+
+        for p in inspect.signature(handler).parameters.values():
+            if p.name == "self":
+                continue
+            if p.name == "event":
+                self.steps.append((_EVENT, p.name, None, _EMPTY))
+            elif p.kind == inspect.Parameter.VAR_POSITIONAL:
+                self.steps.append((_VARARGS, p.name, self._converter(p.annotation), _EMPTY))
+            else:
+                self.steps.append((_ARG, p.name, self._converter(p.annotation), p.default))
+
+    @staticmethod
+    def _converter(annotation) -> Optional[Callable]:
+        if annotation is int:
+            return int
+        if annotation is float:
+            return float
+        return None
+
+    def bind(self, event, args: List[str]) -> List[Any]:
+        call_args = []
+        arg_index = 0
+
+        for kind, name, convert, default in self.steps:
+            if kind == _EVENT:
+                call_args.append(event)
+                continue
+
+            if kind == _VARARGS:
+                rest = args[arg_index:]
+                arg_index = len(args)
+                if convert:
+                    rest = [convert(a) for a in rest]
+                call_args.extend(rest)
+                continue
+
+            if arg_index < len(args):
+                raw = args[arg_index]
+                arg_index += 1
+                if convert is None:
+                    call_args.append(raw)
+                    continue
+                try:
+                    call_args.append(convert(raw))
+                except ValueError:
+                    if default is _EMPTY:
+                        raise ValueError(f"参数类型错误: {name}")
+                    call_args.append(default)
+            elif default is not _EMPTY:
+                call_args.append(default)
+            else:
+                raise ValueError(f"缺少参数: {name}")
+
+        return call_args
+
+    async def __call__(self, event, args: List[str]):
+        # 只允许 coroutine
+        return await self.handler(*self.bind(event, args))
+
+
+class CommandDispatcher:
+    """
+    指令分发器
+
+    1. 非前缀消息和首字符不可能是指令的消息在切分前直接拒绝。
+    2. 指令名和别名映射到同一个预编译的参数绑定器。
+    """
+
+    def __init__(self, prefix: str = "", prefix_en: bool = False):
+        self.prefix = prefix if prefix_en else ""
+        self._binders: Dict[str, ArgBinder] = {}
+        # 所有指令名和别名的首字符，用于 O(1) 快速拒绝
+        self._first_chars: set = set()
+
+    def __bool__(self) -> bool:
+        return bool(self._binders)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._binders
+
+    def register(self, name: str, handler: Callable, aliases: Tuple[str, ...] = ()):
+        binder = ArgBinder(handler)
+        for n in (name, *aliases):
+            self._binders[n] = binder
+            self._first_chars.add(n[0])
+
+    def add_alias(self, alias: str, name: str) -> bool:
+        """为已注册的指令添加别名"""
+        binder = self._binders.get(name)
+        if not binder or not alias:
+            return False
+        self._binders[alias] = binder
+        self._first_chars.add(alias[0])
+        return True
+
+    def match(self, text: str) -> Optional[Tuple[str, ArgBinder, List[str]]]:
+        """
+        解析消息，返回 (指令, 绑定器, 参数)，不是指令时返回 None
+        """
+        if not text:
+            return None
+
+        # 快速路径：前缀和首字符检查，不做任何切分
+        prefix = self.prefix
+        if prefix:
+            if not text.startswith(prefix):
+                text = text.lstrip()
+                if not text.startswith(prefix):
+                    return None
+            text = text[len(prefix):].lstrip()
+        elif text[0].isspace():
+            text = text.lstrip()
+
+        if not text or text[0] not in self._first_chars:
+            return None
+
+        parts = text.split()
+        binder = self._binders.get(parts[0])
+        if binder is None:
+            return None
+
+        return parts[0], binder, parts[1:]
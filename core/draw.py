@@ -0,0 +1,314 @@
+"""
+本地绘图后端
+
+用 Pillow 直接绘制对局列表和角色列表，版式对照 templates 下的同名模板。
+本模块在渲染子进程中执行，只依赖 Pillow，不导入 AstrBot。
+"""
+
+import os
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageFont
+except ImportError:  # 未安装 Pillow 时本地渲染不可用
+    Image = None
+
+
+# 常见系统中文字体，按顺序查找 (常规, 粗体)
+FONT_CANDIDATES: List[Tuple[str, str]] = [
+    ("/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc", "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc"),
+    ("/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc", "/usr/share/fonts/noto-cjk/NotoSansCJK-Bold.ttc"),
+    ("/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc", "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Bold.ttc"),
+    ("/usr/share/fonts/truetype/wqy/wqy-microhei.ttc", ""),
+    ("/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc", ""),
+    ("/usr/share/fonts/wqy-microhei/wqy-microhei.ttc", ""),
+    ("C:/Windows/Fonts/msyh.ttc", "C:/Windows/Fonts/msyhbd.ttc"),
+    ("C:/Windows/Fonts/simhei.ttf", ""),
+    ("/System/Library/Fonts/PingFang.ttc", ""),
+    ("/System/Library/Fonts/STHeiti Medium.ttc", ""),
+]
+
+BACKGROUND = "#f1f2f6"
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def find_fonts(regular: str = "", bold: str = "") -> Optional[Dict[str, str]]:
+    """返回 {"regular": 路径, "bold": 路径}，找不到中文字体时返回 None"""
+    if regular:
+        if not os.path.exists(regular):
+            return None
+        return {"regular": regular, "bold": bold if bold and os.path.exists(bold) else regular}
+    for path, bold_path in FONT_CANDIDATES:
+        if os.path.exists(path):
+            return {"regular": path, "bold": bold_path if bold_path and os.path.exists(bold_path) else path}
+    return None
+
+
+def icon_path(icon_dir: Path, url: str) -> Path:
+    """图标在本地目录中的文件名"""
+    return Path(icon_dir) / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.png"
+
+
+SHADOW_BLUR = 8
+
+
+def _shadow_tile(width: int, height: int, radius: int):
+    """box-shadow: 0 4px 16px rgba(0,0,0,0.08) 的近似"""
+    margin = SHADOW_BLUR * 2
+    tile = Image.new("L", (width + margin * 2, height + margin * 2), 0)
+    ImageDraw.Draw(tile).rounded_rectangle((margin, margin, margin + width, margin + height), radius, fill=20)
+    return tile.filter(ImageFilter.GaussianBlur(SHADOW_BLUR))
+
+
+@lru_cache(maxsize=64)
+def _font(path: str, size: int):
+    # 不需要复杂文字排版，BASIC 布局比 raqm 快得多
+    return ImageFont.truetype(path, size, layout_engine=ImageFont.Layout.BASIC)
+
+
+class _Canvas:
+    """按 CSS 习惯封装的绘制工具"""
+
+    def __init__(self, width: int, height: int, fonts: Dict[str, str], shadows=()):
+        self.image = Image.new("RGB", (width, height), BACKGROUND)
+        self.fonts = fonts
+        # 卡片阴影：同尺寸的卡片共用一张模糊后的阴影贴图，再垫到背景上
+        tiles: Dict[Tuple[int, int, int], Any] = {}
+        for box, radius in shadows:
+            x0, y0, x1, y1 = [int(v) for v in box]
+            size = (x1 - x0, y1 - y0, radius)
+            if size not in tiles:
+                tiles[size] = _shadow_tile(*size)
+            self.image.paste((0, 0, 0), (x0 - SHADOW_BLUR * 2, y0 + 4 - SHADOW_BLUR * 2), tiles[size])
+        self.draw = ImageDraw.Draw(self.image)
+
+    def font(self, size: int, bold: bool = False):
+        return _font(self.fonts["bold" if bold else "regular"], size)
+
+    def text_width(self, text: str, size: int, bold: bool = False) -> float:
+        return self.draw.textlength(text, font=self.font(size, bold))
+
+    def text(self, xy, text: str, size: int, color: str, bold: bool = False, anchor: str = "la"):
+        self.draw.text(xy, text, fill=color, font=self.font(size, bold), anchor=anchor)
+
+    def pill(self, x: float, y: float, text: str, size: int, fg: str, bg, pad_x: int, pad_y: int,
+             radius: int, bold: bool = True) -> float:
+        """圆角标签，返回宽度"""
+        width = self.text_width(text, size, bold) + pad_x * 2
+        height = size + pad_y * 2
+        self.draw.rounded_rectangle((x, y, x + width, y + height), radius, fill=bg)
+        self.text((x + width / 2, y + height / 2), text, size, fg, bold, anchor="mm")
+        return width
+
+    def paste_icon(self, path: Optional[Path], box, radius: int) -> bool:
+        if path is None or not path.exists():
+            return False
+        try:
+            icon = Image.open(path).convert("RGBA")
+        except Exception:
+            return False
+        x0, y0, x1, y1 = [int(v) for v in box]
+        icon = icon.resize((x1 - x0, y1 - y0))
+        mask = Image.new("L", icon.size, 0)
+        ImageDraw.Draw(mask).rounded_rectangle((0, 0, icon.size[0] - 1, icon.size[1] - 1), radius, fill=255)
+        alpha = ImageChops.multiply(icon.getchannel("A"), mask)
+        self.image.paste(icon.convert("RGB"), (x0, y0), alpha)
+        return True
+
+
+# ======================
+# 对局列表 wangzhezhanji.html
+# ======================
+
+RESULT_STYLE = {
+    1: ("#e5f4ff", "#4a90e2", "胜利"),
+    2: ("#ffe9e9", "#d93939", "失败"),
+}
+DRAW_STYLE = ("#f1f2f3", "#777777", "平局")
+
+
+def _num(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _achievements(m: Dict[str, Any]) -> List[str]:
+    tags = []
+    if _num(m.get("godLikeCnt")) > 0:
+        tags.append(f"超神 × {_num(m.get('godLikeCnt'))}")
+    if _num(m.get("firstBlood")) > 0:
+        tags.append("一血")
+    for key, label in (("hero1TripleKillCnt", "三杀"), ("hero1UltraKillCnt", "四杀"), ("hero1RampageCnt", "五杀")):
+        if _num(m.get(key)) > 0:
+            tags.append(f"{label} × {_num(m.get(key))}")
+    return tags
+
+
+def _draw_zhanji(data: Dict[str, Any], fonts: Dict[str, str], icon_dir: Optional[Path]) -> "Image.Image":
+    matches = data.get("data") or []
+    width, pad = 940, 20
+    left, right = pad, width - pad
+    title_h = 21 + 42 + 25
+    # 内容区每行高度：时间 / 段位 / 巅峰赛 / KDA，成就标签另算
+    line_heights = (24 + 6, 21 + 6, 21 + 6, 21 + 6)
+    tag_h = 8 + 14 + 12
+
+    heights = []
+    for m in matches:
+        content = sum(line_heights) + (tag_h if _achievements(m) else 0)
+        heights.append(max(content, 76 + 8 + 24) + 32)
+    height = pad + title_h + sum(h + 18 for h in heights) + pad
+
+    boxes = []
+    y = pad + title_h
+    for card_h in heights:
+        boxes.append((left, y, right, y + card_h))
+        y += card_h + 18
+
+    c = _Canvas(width, height, fonts, shadows=[(box, 18) for box in boxes])
+    c.text((width / 2, pad + 21), "王者荣耀 — 对局列表", 32, "#222222", bold=True, anchor="mt")
+
+    for m, box in zip(matches, boxes):
+        y, card_h = box[1], box[3] - box[1]
+        bg, tag_bg, label = RESULT_STYLE.get(_num(m.get("gameresult")), DRAW_STYLE)
+        c.draw.rounded_rectangle(box, 18, fill=bg)
+
+        # 英雄头像和位置
+        icon_box = (left + 16, y + 16, left + 16 + 76, y + 16 + 76)
+        icon = icon_path(icon_dir, m["heroIcon"]) if icon_dir and m.get("heroIcon") else None
+        if not c.paste_icon(icon, icon_box, 10):
+            c.draw.rounded_rectangle(icon_box, 10, fill="#d5d8de")
+        c.text((left + 16 + 38, y + 16 + 76 + 8), str(m.get("desc") or ""), 18, "#333333", bold=True, anchor="mt")
+
+        # 文本行
+        x = left + 16 + 76 + 15
+        ty = y + 16
+        c.text((x, ty), f"{m.get('gametime', '')} · {m.get('mapName', '')}", 18, "#000000")
+        ty += line_heights[0]
+        c.text((x, ty), f"{m.get('roleJobName', '')} · ★{m.get('stars', '')}", 16, "#2ecc71", bold=True)
+        ty += line_heights[1]
+        c.text(
+            (x, ty), f"巅峰赛积分 {m.get('oldMasterMatchScore', '')} → {m.get('newMasterMatchScore', '')}",
+            16, "#056a3a", bold=True
+        )
+        ty += line_heights[2]
+        c.text(
+            (x, ty),
+            f"击杀 {m.get('killcnt', '')}　死亡 {m.get('deadcnt', '')}　助攻 {m.get('assistcnt', '')}　时长 {m.get('time_str', '')}",
+            16, "#555555", bold=True
+        )
+        ty += line_heights[3]
+        tx = x
+        for tag in _achievements(m):
+            tx += c.pill(tx, ty + 8, tag, 14, "#ffffff", (70, 70, 70), 10, 6, 14) + 6
+
+        # 右上角：评价 / MVP 图标和胜负标签，从右向左排列
+        rx = right - 32
+        result_w = c.text_width(label, 14, True) + 24
+        c.pill(rx - result_w, y + 32, label, 14, "#ffffff", tag_bg, 12, 6, 8)
+        rx -= result_w + 8
+        for key in ("mvpUrlV3", "evaluateUrlV3"):
+            url = m.get(key)
+            if not url or not icon_dir:
+                continue
+            path = icon_path(icon_dir, url)
+            if path.exists():
+                try:
+                    with Image.open(path) as img:
+                        w = int(img.width * 32 / max(1, img.height))
+                except Exception:
+                    continue
+                if c.paste_icon(path, (rx - w, y + 32, rx, y + 64), 6):
+                    rx -= w + 8
+            elif key == "mvpUrlV3":
+                # 图标尚未缓存时用文字代替
+                mvp_w = c.text_width("MVP", 14, True) + 24
+                c.pill(rx - mvp_w, y + 32, "MVP", 14, "#222222", "#ffd700", 12, 6, 8)
+                rx -= mvp_w + 8
+
+        # 右下角评分
+        score = f"评分 {m.get('gradeGame', '')}"
+        score_w = c.text_width(score, 20, True) + 28
+        c.pill(right - 32 - score_w, y + card_h - 32 - 32, score, 20, "#222222", "#ffd700", 14, 6, 12)
+
+    return c.image
+
+
+# ======================
+# 角色列表 jueshe.html
+# ======================
+
+def _draw_roster(data: Dict[str, Any], fonts: Dict[str, str], icon_dir: Optional[Path]) -> "Image.Image":
+    rows = [(str(r.get("gokid", "")), str(r.get("name", ""))) for r in data.get("lists") or []]
+    header = ("王者营地ID", "角色名称")
+    width, pad = 1040, 20
+    table_w = int(1000 * 0.66)
+    table_x = (width - table_w) // 2
+    title_h = 32 + 60 + 25
+    head_h = 27 + 14 * 2 + 8
+    row_h = 24 + 14 * 2 + 8
+    height = pad + title_h + 10 + head_h + row_h * len(rows) + 10 + pad
+
+    top = pad + title_h + 10
+    box = (table_x, top, table_x + table_w, top + head_h + row_h * len(rows))
+
+    c = _Canvas(width, height, fonts, shadows=[(box, 12)])
+    c.text((width / 2, pad + 32), "角色查看", 48, "#222222", bold=True, anchor="mt")
+
+    # 列宽按内容比例分配
+    col = [
+        max([c.text_width(header[i], 27, True)] + [c.text_width(r[i], 24) for r in rows]) + 24
+        for i in range(2)
+    ]
+    scale = table_w / sum(col)
+    col = [w * scale for w in col]
+
+    c.draw.rounded_rectangle(box, 12, fill="#ffffff")
+    c.draw.rounded_rectangle((box[0], box[1], box[2], box[1] + head_h), 12, fill="#d93939", corners=(True, True, False, False))
+
+    x = table_x
+    for i, text in enumerate(header):
+        c.text((x + 12, top + head_h / 2), text, 27, "#ffffff", bold=True, anchor="lm")
+        x += col[i]
+
+    y = top + head_h
+    for n, row in enumerate(rows):
+        x = table_x
+        for i, text in enumerate(row):
+            c.text((x + 12, y + row_h / 2), text, 24, "#000000", anchor="lm")
+            x += col[i]
+        if n < len(rows) - 1:
+            c.draw.line((table_x, y + row_h - 1, table_x + table_w, y + row_h - 1), fill="#eeeeee")
+        y += row_h
+
+    return c.image
+
+
+DRAWERS: Dict[str, Callable[[Dict[str, Any], Dict[str, str], Optional[Path]], "Image.Image"]] = {
+    "wangzhezhanji.html": _draw_zhanji,
+    "jueshe.html": _draw_roster,
+}
+
+
+def init_worker(fonts: Dict[str, str]):
+    """渲染子进程初始化：提前加载字体，首次绘制不再等待"""
+    for path in set(fonts.values()):
+        _font(path, 16)
+
+
+def render_file(template: str, data: Dict[str, Any], out_path: str, fonts: Dict[str, str], icon_dir: str = "") -> str:
+    """绘制并保存为 JPEG，返回文件路径（在渲染子进程中执行）"""
+    image = DRAWERS[template](data, fonts, Path(icon_dir) if icon_dir else None)
+    tmp = f"{out_path}.tmp"
+    # 长图编码 JPEG 比 PNG 快数倍；关闭色度抽样保证文字边缘清晰
+    image.save(tmp, format="JPEG", quality=92, subsampling=0)
+    os.replace(tmp, out_path)
+    return out_path
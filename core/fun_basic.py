@@ -1,18 +1,93 @@
+import os
+import re
+import json
+import time
 from pathlib import Path
-import aiofiles
+from typing import Dict, List, Optional, Tuple
 
-async def load_template(template_name: str) -> str:
+from astrbot.api import logger
+
+from .metrics import metrics
+
+
+TEMPLATE_DIR = Path(__file__).parent.parent / "templates"
+
+
+class TemplateRegistry:
     """
-    异步加载模板内容（非阻塞）
+    模板注册表
+
+    启动时一次性读入 templates 目录下的全部模板，之后直接从内存返回。
+    按间隔检查文件修改时间，模板被修改后自动重新加载，无需重启。
     """
-    plugin_dir = Path(__file__).parent.parent
-    template_path = plugin_dir / "templates" / template_name
 
-    if not template_path.exists():
-        raise FileNotFoundError(f"模板文件不存在: {template_path}")
+    def __init__(self, template_dir: Path = TEMPLATE_DIR, check_interval: float = 2.0):
+        self.template_dir = Path(template_dir)
+        self.check_interval = check_interval
+        # name -> (内容, mtime, 上次检查时间)
+        self._templates: Dict[str, Tuple[str, float, float]] = {}
+        # 内容 -> 名称，用于由渲染数据反查模板
+        self._names: Dict[str, str] = {}
+
+    def load_all(self):
+        """加载目录下全部模板"""
+        for path in sorted(self.template_dir.glob("*.html")):
+            self._load(path.name)
+        logger.info(f"已加载 {len(self._templates)} 个模板")
+
+    def _load(self, template_name: str) -> str:
+        template_path = self.template_dir / template_name
+        try:
+            mtime = os.stat(template_path).st_mtime
+        except FileNotFoundError:
+            self._templates.pop(template_name, None)
+            raise FileNotFoundError(f"模板文件不存在: {template_path}")
+
+        with open(template_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        self._templates[template_name] = (content, mtime, time.monotonic())
+        self._names[content] = template_name
+        return content
+
+    def name_of(self, content: str) -> Optional[str]:
+        """由模板内容反查模板名称"""
+        return self._names.get(content)
+
+    def get(self, template_name: str) -> str:
+        """获取模板内容，必要时重新加载"""
+        cached = self._templates.get(template_name)
+        if cached is None:
+            return self._load(template_name)
+
+        content, mtime, checked_at = cached
+        now = time.monotonic()
+        if now - checked_at < self.check_interval:
+            return content
+
+        try:
+            current = os.stat(self.template_dir / template_name).st_mtime
+        except FileNotFoundError:
+            self._templates.pop(template_name, None)
+            raise FileNotFoundError(f"模板文件不存在: {self.template_dir / template_name}")
+
+        if current != mtime:
+            logger.info(f"模板已修改，重新加载: {template_name}")
+            return self._load(template_name)
 
-    async with aiofiles.open(template_path, "r", encoding="utf-8") as f:
-        return await f.read()
+        self._templates[template_name] = (content, mtime, now)
+        return content
+
+
+# 全局模板注册表
+templates = TemplateRegistry()
+
+
+@metrics.timed("template")
+async def load_template(template_name: str) -> str:
+    """
+    加载模板内容（从模板注册表读取，热路径无文件 I/O）
+    """
+    return templates.get(template_name)
     
 
 def extract_fields(data_list, fields):
@@ -36,5 +111,74 @@ def extract_fields(data_list, fields):
     return result
 
 
+def parse_user_pairs(text: str) -> Tuple[List[Tuple[int, str]], int]:
+    """
+    解析批量导入的角色数据
+
+    支持两种格式：
+    1. JSON：[{"gokid": 1, "name": "a"}]、[[1, "a"]] 或 {"1": "a"}
+    2. 文本/CSV：按 "营地ID 名称" 成对出现，分隔符可以是空白、逗号或分号，
+       表头等无法识别的内容会被跳过
+
+    Returns:
+        (有效的 (gokid, name) 列表, 无效条目数)
+    """
+    text = text.strip().lstrip("\ufeff")
+    if not text:
+        return [], 0
+
+    if text[0] in "[{":
+        try:
+            return _parse_user_json(json.loads(text))
+        except json.JSONDecodeError:
+            pass
+
+    pairs = []
+    invalid = 0
+    tokens = [t for t in re.split(r"[\s,，;；]+", text) if t]
+    i = 0
+    while i < len(tokens):
+        try:
+            gokid = int(tokens[i])
+        except ValueError:
+            invalid += 1
+            i += 1
+            continue
+        if gokid <= 0 or i + 1 >= len(tokens):
+            invalid += 1
+            i += 1
+            continue
+        pairs.append((gokid, tokens[i + 1].strip()))
+        i += 2
+    return pairs, invalid
+
 
+def _parse_user_json(data) -> Tuple[List[Tuple[int, str]], int]:
+    if isinstance(data, dict):
+        items = list(data.items())
+    elif isinstance(data, list):
+        items = []
+        for item in data:
+            if isinstance(item, dict):
+                items.append((item.get("gokid"), item.get("name")))
+            elif isinstance(item, (list, tuple)) and len(item) >= 2:
+                items.append((item[0], item[1]))
+            else:
+                items.append((None, None))
+    else:
+        return [], 1
 
+    pairs = []
+    invalid = 0
+    for gokid, name in items:
+        try:
+            gokid = int(gokid)
+        except (TypeError, ValueError):
+            invalid += 1
+            continue
+        name = str(name or "").strip()
+        if gokid <= 0 or not name:
+            invalid += 1
+            continue
+        pairs.append((gokid, name))
+    return pairs, invalid
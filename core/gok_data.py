@@ -4,20 +4,85 @@
 # pyright: reportOptionalMemberAccess=false
 # pyright: reportCallIssue=false
 
+import json
+import time
+import asyncio
 from datetime import datetime
-from typing import Dict, Any, Optional, List, Union
-import base64
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Union, Tuple, Set, Callable, Awaitable
+import sqlite3
 
 from astrbot.api import logger
 from astrbot.api import AstrBotConfig
 
-from .request import APIClient
+from .request import APIClient, PoolConfig, DownloadResult
+from .limiter import RateLimiter, APIBusyError, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from .breaker import RetryPolicy, CircuitOpenError
 from .sqlite import AsyncSQLiteDB
-from .fun_basic import load_template,extract_fields
+from .cache import ResponseCache, CachePolicy
+from .user_index import UserIndex
+from .match_store import MatchStore
+from .image_cache import ImageCache, ImageEntry
+from .hero_power import HeroPowerStore, REGION_TYPES, LEVELS
+from .heroes import HeroIndex
+from .prefetch import Prefetcher
+from . import draw
+from .metrics import metrics
+from .fun_basic import load_template,extract_fields,templates,parse_user_pairs
 
 class GOKServer:
-    def __init__(self, api_config, config:AstrBotConfig, sqlite:AsyncSQLiteDB ):
-        self._api = APIClient()
+    # 多人战绩最多人数
+    MULTI_MAX_PLAYERS = 5
+    # 排行榜排序方式，以及参与排名的最少对局数
+    LEADERBOARD_SORTS = {
+        "胜率": "winrate",
+        "KDA": "kda",
+        "评分": "grade",
+        "积分": "master_score",
+    }
+    LEADERBOARD_MIN_GAMES = 3
+    # 图标下载失败后的重试间隔（秒）
+    ICON_RETRY = 3600
+
+    def __init__(self, api_config, config:AstrBotConfig, sqlite:AsyncSQLiteDB, data_dir: Union[str, Path] = "." ):
+        # 按主机限流
+        limit_conf = config.get("ratelimit") or {}
+        limiter = None
+        if limit_conf.get("enable", True):
+            limiter = RateLimiter(
+                rate=limit_conf.get("rate", 2.0),
+                burst=limit_conf.get("burst", 5),
+                max_queue=limit_conf.get("max_queue", 50),
+                max_wait=limit_conf.get("max_wait", 5.0),
+                overrides=RateLimiter.parse_overrides(limit_conf.get("hosts", []))
+            )
+
+        # 重试与熔断
+        retry_conf = config.get("retry") or {}
+        retry = RetryPolicy(
+            retries=retry_conf.get("retries", 2),
+            backoff_base=retry_conf.get("backoff_base", 0.3),
+            backoff_max=retry_conf.get("backoff_max", 2.0),
+            attempt_timeout=retry_conf.get("attempt_timeout", 4.0),
+            deadline=retry_conf.get("deadline", 10.0)
+        )
+
+        # 连接池
+        http_conf = config.get("http") or {}
+        pool = PoolConfig(
+            limit=http_conf.get("limit", 100),
+            limit_per_host=http_conf.get("limit_per_host", 10),
+            ttl_dns_cache=http_conf.get("ttl_dns_cache", 300),
+            keepalive_timeout=http_conf.get("keepalive_timeout", 30.0),
+            drain_timeout=http_conf.get("drain_timeout", 5.0)
+        )
+        self._api = APIClient(
+            limiter=limiter,
+            retry=retry,
+            breaker_threshold=retry_conf.get("breaker_threshold", 5),
+            breaker_cooldown=retry_conf.get("breaker_cooldown", 30.0),
+            pool=pool
+        )
         # 引用API配置文件
         self._api_config = api_config
         # 引用插件配置文件
@@ -38,13 +103,133 @@ class GOKServer:
         else:
             logger.debug(f"获取柠柚API令牌成功。{self.nyapi_token}")
 
+        # 角色名称索引
+        self._users = UserIndex(self._sql_db)
+
+        # 本地对局历史
+        history_conf = self._config.get("history") or {}
+        self.history_en = history_conf.get("enable", True)
+        self._matches = MatchStore(
+            self._sql_db,
+            max_per_player=history_conf.get("max_per_player", 500),
+            max_age_days=history_conf.get("max_age_days", 180)
+        )
+
+        # 本地渲染用的图标正在下载的地址及任务
+        self._icon_pending: Set[str] = set()
+        self._icon_tasks: Set[asyncio.Task] = set()
+        # 下载失败的图标地址及时间，一段时间内不再重试（离线环境下避免反复请求）
+        self._icon_failed: Dict[str, float] = {}
+
+        # 各角色对局列表最近一次从上游同步的时间，排行榜据此复用本地历史
+        self._synced: Dict[Tuple[str, str], float] = {}
+
+        # 多人战绩
+        multi_conf = self._config.get("multi") or {}
+        self.multi_concurrency = max(1, int(multi_conf.get("concurrency", self.MULTI_MAX_PLAYERS)))
+
+        # 群排行榜
+        leaderboard_conf = self._config.get("leaderboard") or {}
+        self.leaderboard_concurrency = max(1, int(leaderboard_conf.get("concurrency", 4)))
+        self.leaderboard_fresh = float(leaderboard_conf.get("fresh_minutes", 30)) * 60
+        self.leaderboard_timeout = float(leaderboard_conf.get("timeout", 60))
+        self.leaderboard_size = max(1, int(leaderboard_conf.get("size", 30)))
+
+        # 资料图片磁盘缓存，有效期沿用接口配置中的 cache.ttl
+        image_conf = self._config.get("image_cache") or {}
+        self._images = ImageCache(
+            self._sql_db,
+            Path(data_dir) / "ziliao",
+            ttl=(self._api_config.get("gok_ziliao", {}).get("cache") or {}).get("ttl", 600),
+            max_bytes=int(image_conf.get("max_mb", 200)) * 1024 * 1024
+        )
+
+        # 英雄名称索引，内置列表之外的新英雄查询成功后记入补充列表
+        self._hero_extra = Path(data_dir) / "heroes_extra.json"
+        self._heroes = HeroIndex.load(extra=self._hero_extra)
+
+        # 英雄上榜战力快照
+        snapshot_conf = self._config.get("zhanli_snapshot") or {}
+        self.snapshot_en = snapshot_conf.get("enable", False)
+        self._power = HeroPowerStore(
+            self._sql_db,
+            self._fetch_zhanli,
+            self._heroes.names,
+            interval=float(snapshot_conf.get("interval_hours", 6)) * 3600,
+            concurrency=snapshot_conf.get("concurrency", 2)
+        )
+
+        # 热门角色预取
+        prefetch_conf = self._config.get("prefetch") or {}
+        self.prefetch_en = prefetch_conf.get("enable", False)
+        self._prefetcher = Prefetcher(
+            self._prefetch,
+            top_n=prefetch_conf.get("top_n", 10),
+            budget=prefetch_conf.get("budget", 120),
+            half_life=float(prefetch_conf.get("half_life_hours", 6)) * 3600,
+            idle=prefetch_conf.get("idle_seconds", 30),
+            interval=prefetch_conf.get("interval", 60)
+        )
+
+        # 接口响应缓存
+        cache_conf = self._config.get("cache") or {}
+        self.cache_en = cache_conf.get("enable", True)
+        self._cache = ResponseCache(
+            max_entries=cache_conf.get("max_entries", 512),
+            sqlite=self._sql_db if cache_conf.get("persist", True) else None
+        )
+        for key, api in self._api_config.items():
+            policy = api.get("cache")
+            if policy:
+                self._cache.set_policy(key, CachePolicy(**policy))
+
+
+    async def initialize(self):
+        """异步初始化：加载模板、角色索引和持久化数据"""
+        templates.load_all()
+        await self._users.load()
+        await self._images.load()
+
+        if self.history_en:
+            await self._matches.compact()
+
+        if self.cache_en:
+            await self._cache.load()
+
+        if self.snapshot_en and self.nyapi_token:
+            self._power.start()
+
+        if self.prefetch_en and self.ytapi_token:
+            self._prefetcher.start()
+
 
     async def close(self):
         """释放底层 APIClient 资源"""
+        await self._power.stop()
+        await self._prefetcher.stop()
+        for task in list(self._icon_tasks):
+            task.cancel()
+        if self._icon_tasks:
+            await asyncio.gather(*self._icon_tasks, return_exceptions=True)
+
+        if self._cache:
+            await self._cache.close()
+            self._cache = None
+
         if self._api:
+            logger.info(f"请求合并统计: {self._api.flight_stats()}")
+            logger.info(f"熔断统计: {self._api.breaker_stats()}")
+            logger.info(f"连接池统计: {self._api.pool_stats()}")
+            if self._api.limiter:
+                logger.info(f"限流统计: {self._api.limiter.stats()}")
             await self._api.close()
             self._api = None
 
+        logger.info(f"资料图片缓存统计: {self._images.stats()}")
+        logger.info(f"上榜战力快照统计: {self._power.stats()}")
+        if self.prefetch_en:
+            logger.info(f"热门角色预取统计: {self._prefetcher.stats()}")
+
 
     def _init_return_data(self) -> Dict[str, Any]:
         """初始化标准的返回数据结构"""
@@ -60,15 +245,25 @@ class GOKServer:
             config_key: str, 
             method: str, 
             params: Optional[Dict[str, Any]] = None, 
-            out_key: Optional[str] = "data"
+            out_key: Optional[str] = "data",
+            meta: Optional[Dict[str, Any]] = None,
+            priority: int = PRIORITY_INTERACTIVE,
+            use_cache: bool = True,
+            refresh: bool = False,
+            on_fetch: Optional[Callable[[Any], Awaitable[None]]] = None
         ) -> Optional[Any]:
             """
-            基础请求封装，处理配置获取和API调用。
+            基础请求封装，处理配置获取、缓存和API调用。
             
             :param config_key: 配置字典中对应 API 的键名。
             :param method: HTTP方法 ('GET' 或 'POST')。
             :param params: 请求参数或 Body 数据。
             :param out_key: 响应数据中需要提取的字段。
+            :param meta: 可选的输出字典，返回缓存兜底数据时写入 as_of，限流拒绝时写入 busy。
+            :param priority: 请求优先级，后台任务使用 PRIORITY_BACKGROUND。
+            :param use_cache: 为 False 时不读写响应缓存，用于自带存储的后台任务。
+            :param refresh: 为 True 时跳过缓存读取，请求上游后写入缓存，用于预取。
+            :param on_fetch: 实际从上游取到数据时调用（包括后台刷新），命中缓存时不调用。
             :return: 成功时返回提取后的数据，失败时返回 None。
             """
             try:
@@ -86,22 +281,123 @@ class GOKServer:
                 if not url:
                     logger.error(f"API配置缺少 URL: {config_key}")
                     return None
-                    
-                if method.upper() == 'POST':
-                    data = await self._api.post(url, data=request_params, out_key=out_key)
-                else: # 默认为 GET
-                    data = await self._api.get(url, params=request_params, out_key=out_key)
-                
-                if not data:
-                    logger.warning(f"获取接口信息失败或返回空数据: {config_key}")
-                
-                return data
+
+                def make_loader(priority: int, meta: Optional[Dict[str, Any]]):
+                    async def loader():
+                        try:
+                            data = await self._fetch(config_key, url, method, request_params, out_key, priority)
+                            if data and on_fetch:
+                                await on_fetch(data)
+                            return data
+                        except APIBusyError as e:
+                            logger.warning(f"请求被限流拒绝 ({config_key}): {e}")
+                            if meta is not None:
+                                meta["busy"] = True
+                            return None
+                        except CircuitOpenError as e:
+                            logger.warning(f"上游熔断中 ({config_key}): {e}")
+                            if meta is not None:
+                                meta["unavailable"] = True
+                            return None
+                    return loader
+
+                loader = make_loader(priority, meta)
+
+                # 只缓存配置了缓存策略的接口
+                if not use_cache or not self.cache_en or not api_config.get("cache"):
+                    return await loader()
+
+                cache_key = self._cache_key(config_key, request_params, out_key)
+                # 过期数据的后台刷新不占用交互请求的优先级
+                return await self._cache.fetch(
+                    cache_key, config_key, loader, meta, refresh=refresh,
+                    background_loader=make_loader(PRIORITY_BACKGROUND, None)
+                )
                 
             except Exception as e:
                 logger.error(f"基础请求调用出错 ({config_key}): {e}")
                 return None
 
 
+    def _cache_key(self, config_key: str, request_params: Dict[str, Any], out_key: Optional[str] = "data") -> str:
+        """响应缓存键，request_params 为合并了配置默认值的完整参数"""
+        # out_key 不同提取结果不同，一并计入缓存键
+        return ResponseCache.make_key(config_key, {**request_params, "_out": out_key or ""})
+
+
+    async def _fetch(
+            self,
+            config_key: str,
+            url: str,
+            method: str,
+            request_params: Dict[str, Any],
+            out_key: Optional[str],
+            priority: int = PRIORITY_INTERACTIVE
+        ):
+        """实际请求上游接口"""
+        with metrics.span("upstream"):
+            if method.upper() == 'POST':
+                data = await self._api.post(url, data=request_params, out_key=out_key, priority=priority)
+            else: # 默认为 GET
+                data = await self._api.get(url, params=request_params, out_key=out_key, priority=priority)
+        
+        if not data:
+            logger.warning(f"获取接口信息失败或返回空数据: {config_key}")
+        
+        return data
+
+
+    async def _base_download(
+            self,
+            config_key: str,
+            params: Dict[str, Any],
+            dest: Path,
+            meta: Optional[Dict[str, Any]] = None,
+            priority: int = PRIORITY_INTERACTIVE,
+            headers: Optional[Dict[str, str]] = None
+        ) -> Optional[DownloadResult]:
+        """
+        图片接口的下载封装，直接流式写入 dest，不经过内存缓存。
+
+        :return: 成功时返回下载结果，失败时返回 None。
+        """
+        try:
+            api_config = self._api_config.get(config_key)
+            if not api_config or not api_config.get("url"):
+                logger.error(f"配置文件中未找到 key 或缺少 URL: {config_key}")
+                return None
+
+            request_params = api_config.get("params", {}).copy()
+            request_params.update(params)
+
+            with metrics.span("download"):
+                return await self._api.download(
+                    api_config["url"], dest, params=request_params, headers=headers, priority=priority
+                )
+
+        except APIBusyError as e:
+            logger.warning(f"请求被限流拒绝 ({config_key}): {e}")
+            if meta is not None:
+                meta["busy"] = True
+        except CircuitOpenError as e:
+            logger.warning(f"上游熔断中 ({config_key}): {e}")
+            if meta is not None:
+                meta["unavailable"] = True
+        except Exception as e:
+            logger.error(f"下载调用出错 ({config_key}): {e}")
+        return None
+
+
+    @staticmethod
+    def _fail_msg(meta: Dict[str, Any]) -> str:
+        """接口获取失败时的提示"""
+        if meta.get("busy"):
+            return "查询的人太多了，请稍后再试"
+        if meta.get("unavailable"):
+            return "接口暂时不可用，请稍后再试"
+        return "获取接口信息失败"
+
+
     # --- 业务功能函数 ---
     async def helps(self) -> Dict[str, Any]:
         """功能"""
@@ -134,11 +430,16 @@ class GOKServer:
                 }
             )
 
+        except sqlite3.IntegrityError:
+            return_data["msg"] = f"王者营地ID {gokid} 已存在，如需修改名称请使用角色修改"
+            return return_data
         except FileNotFoundError as e:
             logger.error(f"添加角色失败: {e}")
             return_data["msg"] = "添加角色失败"
             return return_data
 
+        self._users.on_add(gokid, name)
+
         return_data["data"] = (
             "角色添加成功\n"
             f"王者营地ID：{gokid}\n"
@@ -150,6 +451,72 @@ class GOKServer:
         return return_data
     
 
+    async def import_users(self, contents: List[str]) -> Dict[str, Any]:
+        """角色导入 批量数据"""
+        return_data = self._init_return_data()
+
+        # 解析数据，同一ID出现多次时以最后一次为准
+        pairs: Dict[int, str] = {}
+        skipped = 0
+        for content in contents:
+            items, invalid = parse_user_pairs(content)
+            skipped += invalid
+            for gokid, name in items:
+                if gokid in pairs:
+                    skipped += 1
+                pairs[gokid] = name
+
+        if not pairs:
+            return_data["msg"] = "未解析到角色数据，格式：营地ID 名称，每行一个，也可以发送 CSV/JSON 文件"
+            return return_data
+
+        inserted: List[Dict[str, Any]] = []
+        updated: List[Dict[str, Any]] = []
+
+        try:
+            async with self._sql_db.transaction():
+                # 分批查询已有数据，避免超出 SQLite 参数数量限制
+                existing: Dict[int, str] = {}
+                ids = list(pairs.keys())
+                for i in range(0, len(ids), 500):
+                    chunk = ids[i:i + 500]
+                    rows = await self._sql_db.fetch_all(
+                        f"SELECT gokid, name FROM users WHERE gokid IN ({', '.join(['?'] * len(chunk))})",
+                        tuple(chunk)
+                    )
+                    existing.update({row["gokid"]: row["name"] for row in rows})
+
+                for gokid, name in pairs.items():
+                    if gokid not in existing:
+                        inserted.append({"gokid": gokid, "name": name})
+                    elif existing[gokid] != name:
+                        updated.append({"gokid": gokid, "name": name})
+                    else:
+                        skipped += 1
+
+                await self._sql_db.insert_many("users", inserted)
+                await self._sql_db.upsert_many("users", updated, conflict="gokid")
+
+        except Exception as e:
+            logger.error(f"角色导入失败: {e}")
+            return_data["msg"] = "角色导入失败，数据未做任何修改"
+            return return_data
+
+        for row in inserted + updated:
+            self._users.on_add(row["gokid"], row["name"])
+
+        return_data["data"] = (
+            "角色导入完成\n"
+            f"新增：{len(inserted)}\n"
+            f"更新：{len(updated)}\n"
+            f"跳过：{skipped}\n"
+        )
+
+        return_data["code"] = 200
+
+        return return_data
+
+
     async def all(self) -> Dict[str, Any]:
         """角色查看"""
         return_data = self._init_return_data()
@@ -178,6 +545,8 @@ class GOKServer:
         
         # 数据处理
         return_data["data"]["lists"] = data
+        # 角色数据变更时渲染缓存按此标签失效
+        return_data["render_tag"] = "users"
         
         return_data["code"] = 200
    
@@ -228,6 +597,8 @@ class GOKServer:
         
         # 数据处理
         return_data["data"]["lists"] = data
+        # 角色数据变更时渲染缓存按此标签失效
+        return_data["render_tag"] = "users"
         
         return_data["code"] = 200
    
@@ -265,6 +636,8 @@ class GOKServer:
             return_data["msg"] = "避雷修改失败"
             return return_data
 
+        self._users.on_update(gokid, name)
+
         return_data["data"] = (
             "角色修改成功\n"
             f"王者营地ID：{gokid}\n"
@@ -303,6 +676,8 @@ class GOKServer:
             return_data["msg"] = "角色删除失败"
             return return_data
 
+        self._users.on_delete(gokid)
+
         return_data["data"] = f"角色删除成功。王者营地ID：{gokid}"
  
         return_data["code"] = 200
@@ -310,6 +685,7 @@ class GOKServer:
         return return_data
 
 
+    @metrics.timed("gokid")
     async def get_gokid(self,name: str):
         # 判断输入是否为整数
         try:
@@ -321,26 +697,92 @@ class GOKServer:
             else:
                 raise Exception("输入不是ID")
         except (ValueError, TypeError, Exception):
-            # 查询数据
+            # 查询内存索引
             try:
-                data = await self._sql_db.select_one(
-                    "users",
-                    "name=?",
-                    (name,)
-                )
-
-                if not data:
-                    gokid = None
-                    return gokid
-                
-                gokid = data['gokid']
+                gokid = await self._users.resolve(name)
                 return gokid
-            except FileNotFoundError as e:
+            except Exception as e:
                 logger.error(f"查询角色失败: {e}")
                 gokid = None
                 return gokid
    
 
+    @metrics.timed("gokid")
+    async def get_gokids(self, names: List[str]) -> Dict[str, Any]:
+        """批量版 get_gokid，名称一次性从内存索引解析，无法解析的值为 None"""
+        result: Dict[str, Any] = {}
+        lookup = []
+        for name in names:
+            if str(name).isdigit() and int(name) >= 10000000:
+                result[name] = name
+            else:
+                lookup.append(name)
+
+        if lookup:
+            try:
+                result.update(await self._users.resolve_many(lookup))
+            except Exception as e:
+                logger.error(f"查询角色失败: {e}")
+                result.update({name: None for name in lookup})
+        return result
+
+
+    async def battle_list(
+            self,
+            gokid,
+            option,
+            meta: Optional[Dict[str, Any]] = None,
+            limit: int = 25,
+            priority: int = PRIORITY_INTERACTIVE,
+            refresh: bool = False
+        ) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取对局列表（按时间倒序）
+
+        从上游取到的对局（包括缓存的后台刷新）合并进本地历史，再从本地读取最近的 limit 局；
+        命中响应缓存时数据已经合并过，不再重复写入。
+        上游不可用时直接使用本地历史，并通过 meta["as_of"] 标记数据时间。
+        """
+        merge_failed = False
+
+        async def merge(data):
+            nonlocal merge_failed
+            fetched = data.get("list") if isinstance(data, dict) else None
+            if not fetched:
+                return
+            try:
+                with metrics.span("history"):
+                    await self._matches.merge(gokid, option, fetched)
+                self._synced[(str(gokid), str(option))] = time.time()
+            except Exception as e:
+                merge_failed = True
+                logger.error(f"写入本地对局历史出错: {e}")
+
+        params = {"id": gokid, "option": option, "key": self.ytapi_token}
+        data = await self._base_request(
+            "gok_zhanji", "GET", params=params, meta=meta, priority=priority, refresh=refresh,
+            on_fetch=merge if self.history_en else None
+        )
+        upstream = data.get("list") if isinstance(data, dict) else None
+
+        if not self.history_en or merge_failed:
+            return upstream[:limit] if upstream else None
+
+        try:
+            with metrics.span("history"):
+                rows = await self._matches.recent(gokid, option, limit)
+        except Exception as e:
+            logger.error(f"读写本地对局历史出错: {e}")
+            return upstream[:limit] if upstream else None
+
+        if rows and not upstream and meta is not None and "as_of" not in meta:
+            latest = await self._matches.latest(gokid, option)
+            if latest:
+                meta["as_of"] = latest[1]
+
+        return rows or (upstream[:limit] if upstream else None)
+
+
     async def zhanji(self,name: str ,option: str):
         """
         战绩查询
@@ -358,9 +800,7 @@ class GOKServer:
         if not gokid :
             return_data["msg"] = "未查询到该用户，请确认输入正确的角色或营地ID"
             return  return_data
-        
-        #更新参数
-        params = {"id": gokid, "option": option, "key": self.ytapi_token}
+        self._prefetcher.record("zhanji", gokid, option)
         
         # 需要提取的字段
         fields = ["gametime","killcnt","deadcnt","assistcnt","gameresult","mvpcnt","losemvp","mapName",
@@ -371,31 +811,35 @@ class GOKServer:
         comment = ["gametime","killcnt","deadcnt","assistcnt","gameresult","mvpcnt","losemvp","gradeGame"]
 
         # 获取数据
-        data: Optional[List[Dict[str, Any]]] = await self._base_request("gok_zhanji", "GET", params=params)       
-        if not data:
-            return_data["msg"] = "获取接口信息失败"
+        meta = {}
+        battles = await self.battle_list(gokid, option, meta=meta)
+        if not battles:
+            return_data["msg"] = self._fail_msg(meta)
             return  return_data  
+        if "as_of" in meta:
+            return_data["as_of"] = meta["as_of"]
 
         # 处理返回数据
         try:
-            # 提取锐评数据
-            return_data["comment"] = {} 
-            comments = extract_fields(data['list'], comment)
-            comments = comments[:10]
-            return_data["comment"]["data"] = comments 
-
-            # 提取字段
-            result = extract_fields(data['list'], fields)
-            result = result[:25]
-            
-            # 数据处理
-            for m in result:
-                minutes = m["usedTime"] // 60
-                seconds = m["usedTime"] % 60
-                m["time_str"] = f"{minutes}:{seconds:02d}"
-                
-            return_data["data"]["data"] = result  
-            
+            with metrics.span("extract"):
+                # 提取锐评数据
+                return_data["comment"] = {} 
+                comments = extract_fields(battles, comment)
+                comments = comments[:10]
+                return_data["comment"]["data"] = comments 
+
+                # 提取字段
+                result = extract_fields(battles, fields)
+                result = result[:25]
+
+                # 数据处理
+                for m in result:
+                    minutes = m["usedTime"] // 60
+                    seconds = m["usedTime"] % 60
+                    m["time_str"] = f"{minutes}:{seconds:02d}"
+
+                return_data["data"]["data"] = result  
+
         except Exception as e:
             logger.error(f"处理数据时出错: {e}")
             return_data["msg"] = "处理接口返回信息时出错"
@@ -414,6 +858,260 @@ class GOKServer:
         return return_data
 
 
+    @staticmethod
+    def _battle_summary(battles: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """对局列表汇总：胜率、KDA、MVP 次数、平均评分、巅峰赛积分变化"""
+        def num(value) -> float:
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return 0.0
+
+        games = len(battles)
+        wins = sum(1 for b in battles if b.get("gameresult") == 1)
+        kills = sum(num(b.get("killcnt")) for b in battles)
+        deaths = sum(num(b.get("deadcnt")) for b in battles)
+        assists = sum(num(b.get("assistcnt")) for b in battles)
+        mvp = sum(int(num(b.get("mvpcnt"))) + int(num(b.get("losemvp"))) for b in battles)
+        grades = [num(b.get("gradeGame")) for b in battles if num(b.get("gradeGame")) > 0]
+        # 只统计有巅峰赛积分的对局
+        score_delta = sum(
+            num(b.get("newMasterMatchScore")) - num(b.get("oldMasterMatchScore"))
+            for b in battles if num(b.get("oldMasterMatchScore")) and num(b.get("newMasterMatchScore"))
+        )
+
+        return {
+            "games": games,
+            "wins": wins,
+            "winrate": round(wins / games * 100) if games else 0,
+            "kda": round((kills + assists) / max(1.0, deaths), 2),
+            "kills": round(kills / games, 1) if games else 0,
+            "deaths": round(deaths / games, 1) if games else 0,
+            "assists": round(assists / games, 1) if games else 0,
+            "mvp": mvp,
+            "grade": round(sum(grades) / len(grades), 1) if grades else 0,
+            "score_delta": int(score_delta),
+            "recent": "".join(
+                "胜" if b.get("gameresult") == 1 else "负" if b.get("gameresult") == 2 else "平"
+                for b in battles[:10]
+            ),
+        }
+
+
+    async def zhanji_multi(self, names: List[str], option: str):
+        """
+        多人战绩对比
+
+        名称一次性解析，各角色的对局列表并发获取，汇总后渲染为一张对比图。
+        """
+        return_data = self._init_return_data()
+
+        if  self.ytapi_token == "":
+            return_data["msg"] = "系统未配置API访问Token"
+            return return_data
+
+        # 去重并保持输入顺序
+        names = list(dict.fromkeys(names))
+        if len(names) > self.MULTI_MAX_PLAYERS:
+            return_data["msg"] = f"一次最多查询 {self.MULTI_MAX_PLAYERS} 个角色"
+            return return_data
+
+        gokids = await self.get_gokids(names)
+        missing = [name for name in names if not gokids.get(name)]
+        players = [(name, gokids[name]) for name in names if gokids.get(name)]
+        if not players:
+            return_data["msg"] = "未查询到这些用户，请确认输入正确的角色或营地ID"
+            return return_data
+
+        semaphore = asyncio.Semaphore(self.multi_concurrency)
+
+        async def one(name: str, gokid):
+            async with semaphore:
+                meta: Dict[str, Any] = {}
+                self._prefetcher.record("zhanji", gokid, option)
+                battles = await self.battle_list(gokid, option, meta=meta)
+                return name, gokid, battles, meta
+
+        results = await asyncio.gather(*(one(name, gokid) for name, gokid in players))
+
+        rows = []
+        failed = []
+        as_of = None
+        for name, gokid, battles, meta in results:
+            if not battles:
+                failed.append(name)
+                continue
+            with metrics.span("extract"):
+                row = {"name": name, "gokid": gokid, **self._battle_summary(battles)}
+            rows.append(row)
+            if "as_of" in meta:
+                as_of = min(as_of or meta["as_of"], meta["as_of"])
+
+        if not rows:
+            return_data["msg"] = self._fail_msg(results[0][3])
+            return return_data
+
+        # 多人时每项指标的最佳值高亮显示
+        for row in rows:
+            row["best"] = []
+        if len(rows) > 1:
+            for key in ("winrate", "kda", "mvp", "grade", "score_delta"):
+                best = max(row[key] for row in rows)
+                for row in rows:
+                    if row[key] == best:
+                        row["best"].append(key)
+
+        try:
+            return_data["temp"] = await load_template("zhanji_compare.html")
+        except FileNotFoundError as e:
+            logger.error(f"加载模板失败: {e}")
+            return_data["msg"] = "系统错误：模板文件不存在"
+            return return_data
+
+        return_data["data"]["players"] = rows
+        return_data["data"]["missing"] = missing
+        return_data["data"]["failed"] = failed
+        if as_of:
+            return_data["as_of"] = as_of
+
+        return_data["code"] = 200
+
+        return return_data
+
+
+    async def _leaderboard_battles(self, gokid, option, local_only: bool, meta: Dict[str, Any]):
+        """排行榜单个角色的对局：本地历史足够新或上游已繁忙时不再请求上游"""
+        if self.history_en:
+            synced = self._synced.get((str(gokid), str(option)), 0)
+            if local_only or time.time() - synced < self.leaderboard_fresh:
+                rows = await self._matches.recent(gokid, option, 25)
+                if rows or local_only:
+                    return rows
+        elif local_only:
+            return None
+        return await self.battle_list(gokid, option, meta=meta, priority=PRIORITY_BACKGROUND)
+
+
+    async def leaderboard(
+            self,
+            sort: str = "胜率",
+            option: str = "0",
+            progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+        ):
+        """
+        群排行榜
+
+        汇总全部已登记角色的最近对局，按胜率 / KDA / 评分 / 巅峰积分排序。
+        上游请求使用后台优先级并限制并发；本地历史在 fresh_minutes 内同步过的角色直接读本地，
+        一旦请求被限流拒绝或上游熔断，其余角色也改读本地历史。
+        各角色结果完成一个汇总一个，每次进度通过 progress(已完成, 总数) 回调；
+        超过 timeout 仍未完成的角色使用本地历史。
+        """
+        return_data = self._init_return_data()
+
+        if  self.ytapi_token == "":
+            return_data["msg"] = "系统未配置API访问Token"
+            return return_data
+
+        key = self.LEADERBOARD_SORTS.get(sort.upper() if sort.isascii() else sort)
+        if not key:
+            return_data["msg"] = f"排序方式可选：{'、'.join(self.LEADERBOARD_SORTS)}"
+            return return_data
+
+        try:
+            players = await self._users.items()
+        except Exception as e:
+            logger.error(f"读取角色列表失败: {e}")
+            return_data["msg"] = "读取角色列表失败，请稍后再试"
+            return return_data
+        if not players:
+            return_data["msg"] = "还没有登记任何角色，请先使用 角色添加 或 角色导入"
+            return return_data
+
+        semaphore = asyncio.Semaphore(self.leaderboard_concurrency)
+        degraded = False
+
+        async def one(gokid, name):
+            nonlocal degraded
+            async with semaphore:
+                meta: Dict[str, Any] = {}
+                battles = await self._leaderboard_battles(gokid, option, degraded, meta)
+                if meta.get("busy") or meta.get("unavailable"):
+                    degraded = True
+                return gokid, name, battles
+
+        def summarize(gokid, name, battles):
+            if not battles:
+                return None
+            row = {"name": name, "gokid": gokid, **self._battle_summary(battles)}
+            # 最近一局的巅峰赛积分
+            row["master_score"] = next(
+                (int(b["newMasterMatchScore"]) for b in battles
+                 if str(b.get("newMasterMatchScore") or "0").isdigit() and int(b["newMasterMatchScore"])),
+                0
+            )
+            return row
+
+        rows: List[Dict[str, Any]] = []
+        done: Set[int] = set()
+        tasks = [asyncio.create_task(one(gokid, name)) for gokid, name in players]
+        try:
+            for future in asyncio.as_completed(tasks, timeout=self.leaderboard_timeout):
+                gokid, name, battles = await future
+                done.add(gokid)
+                row = summarize(gokid, name, battles)
+                if row:
+                    rows.append(row)
+                if progress:
+                    await progress(len(done), len(players))
+        except asyncio.TimeoutError:
+            logger.warning(f"排行榜统计超时，{len(players) - len(done)} 个角色改用本地历史")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # 超时未完成的角色
+        if self.history_en:
+            for gokid, name in players:
+                if gokid not in done:
+                    try:
+                        row = summarize(gokid, name, await self._matches.recent(gokid, option, 25))
+                    except Exception as e:
+                        logger.error(f"读取本地对局历史出错: {e}")
+                        break
+                    if row:
+                        rows.append(row)
+
+        ranked = [row for row in rows if row["games"] >= self.LEADERBOARD_MIN_GAMES]
+        if not ranked:
+            return_data["msg"] = "暂无足够的对局数据，请稍后再试"
+            return return_data
+        ranked.sort(key=lambda row: (row[key], row["games"]), reverse=True)
+        for i, row in enumerate(ranked, 1):
+            row["rank"] = i
+
+        try:
+            return_data["temp"] = await load_template("leaderboard.html")
+        except FileNotFoundError as e:
+            logger.error(f"加载模板失败: {e}")
+            return_data["msg"] = "系统错误：模板文件不存在"
+            return return_data
+
+        return_data["data"]["sort"] = sort
+        return_data["data"]["sort_key"] = key
+        return_data["data"]["players"] = ranked[:self.leaderboard_size]
+        return_data["data"]["total"] = len(players)
+        return_data["data"]["ranked"] = len(ranked)
+        return_data["data"]["unranked"] = len(players) - len(ranked)
+        return_data["data"]["min_games"] = self.LEADERBOARD_MIN_GAMES
+        return_data["data"]["time"] = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+        return_data["code"] = 200
+
+        return return_data
+
+
     async def ziliao(self, name: str):
         return_data = self._init_return_data()
         # 获取配置中的 Token
@@ -428,30 +1126,26 @@ class GOKServer:
             return_data["msg"] = "未查询到该用户，请确认输入正确的角色或营地ID"
             return  return_data
 
-        #更新参数
-        params = {"id": gokid, "key": self.ytapi_token}
-
-        # 获取数据
-        data: Optional[List[Dict[str, Any]]] = await self._base_request("gok_ziliao", "GET", params=params, out_key="")   
-        
-        if not data:
-            return_data["msg"] = "获取接口信息失败"
-            return  return_data  
+        self._prefetcher.record("ziliao", gokid)
 
-        try:
-            # 转 base64
-            return_data["data"]["img_base64"] = base64.b64encode(data).decode("utf-8")
-        except Exception as e:
-            logger.error(f"处理数据时出错: {e}")
-            return_data["msg"] = "处理接口返回信息时出错"
-            return  return_data
+        # 本地缓存有效期内直接使用
+        entry = self._images.get(gokid)
+        if entry and self._images.is_fresh(entry):
+            await self._images.hit(entry)
+            return_data["data"] = str(entry.path)
+            return_data["code"] = 200
+            return return_data
 
-        # 加载模板
-        try:
-            return_data["temp"] = await load_template("wzry_zl.html")
-        except FileNotFoundError:
-            logger.error(f"加载模板失败")
-            return_data["msg"] = "系统错误：模板文件不存在"
+        meta = {}
+        path = await self._download_ziliao(gokid, entry, meta)
+        if path:
+            return_data["data"] = str(path)
+        elif entry:
+            # 上游失败时使用上一次下载的图片
+            return_data["data"] = str(entry.path)
+            return_data["as_of"] = entry.fetched_at
+        else:
+            return_data["msg"] = self._fail_msg(meta)
             return  return_data
 
         return_data["code"] = 200
@@ -459,6 +1153,167 @@ class GOKServer:
         return return_data
 
 
+    async def _download_ziliao(
+            self,
+            gokid,
+            entry: Optional[ImageEntry],
+            meta: Dict[str, Any],
+            priority: int = PRIORITY_INTERACTIVE
+        ) -> Optional[Path]:
+        """流式下载资料图片到本地文件（有旧图片时做条件请求），失败时返回 None"""
+        params = {"id": gokid, "key": self.ytapi_token}
+        dest = self._images.path_for(gokid)
+        headers = self._images.conditional_headers(entry)
+        result = await self._base_download("gok_ziliao", params, dest, meta=meta, priority=priority, headers=headers)
+
+        if result and result.not_modified and entry:
+            await self._images.revalidated(entry, result)
+            return entry.path
+        if result and not result.not_modified:
+            await self._images.record(gokid, result)
+            return result.path
+        return None
+
+
+    async def _prefetch(self, gokid: int, option: str, budget: int, meta: Dict[str, Any]) -> int:
+        """
+        预取单个角色的对局列表和资料图片，返回消耗的请求数
+
+        只刷新已查询过（本地有数据）且即将过期（已过有效期的一半）的数据，
+        只查过战绩的角色不会预取资料图片，反之亦然。
+        """
+        used = 0
+
+        if self.cache_en and self._api_config.get("gok_zhanji", {}).get("cache"):
+            policy = self._cache.policy("gok_zhanji")
+            request_params = {
+                **self._api_config["gok_zhanji"].get("params", {}),
+                "id": gokid, "option": option, "key": self.ytapi_token
+            }
+            key = self._cache_key("gok_zhanji", request_params)
+            entry = self._cache.peek(key)
+            if entry is not None and entry.age > policy.ttl / 2:
+                used += 1
+                await self.battle_list(gokid, option, meta=meta, priority=PRIORITY_BACKGROUND, refresh=True)
+                # 上游失败时 battle_list 仍可能返回本地历史，以缓存是否更新为准
+                if entry is not self._cache.peek(key):
+                    self._prefetcher.warmed("zhanji", gokid, option, policy.ttl)
+
+        if used < budget and not (meta.get("busy") or meta.get("unavailable")):
+            image = self._images.get(gokid)
+            if image is not None and time.time() - image.fetched_at > self._images.ttl / 2:
+                used += 1
+                if await self._download_ziliao(gokid, image, meta, priority=PRIORITY_BACKGROUND):
+                    self._prefetcher.warmed("ziliao", gokid, "", self._images.ttl)
+
+        return used
+
+
+    def download_icons(self, urls: List[str], directory: Path):
+        """后台下载本地渲染用的英雄头像和评价图标，不等待结果，本次渲染先用占位图"""
+        now = time.time()
+        urls = [
+            url for url in urls
+            if url not in self._icon_pending and now - self._icon_failed.get(url, 0) > self.ICON_RETRY
+        ]
+        if not urls or self._api is None:
+            return
+        self._icon_pending.update(urls)
+
+        async def run():
+            try:
+                for url in urls:
+                    try:
+                        result = await self._api.download(
+                            url, draw.icon_path(directory, url), priority=PRIORITY_BACKGROUND
+                        )
+                    except (APIBusyError, CircuitOpenError):
+                        break
+                    except Exception as e:
+                        logger.debug(f"下载图标失败 ({url}): {e}")
+                        result = None
+                    if result is None:
+                        self._icon_failed[url] = time.time()
+            finally:
+                self._icon_pending.difference_update(urls)
+
+        task = asyncio.create_task(run())
+        self._icon_tasks.add(task)
+        task.add_done_callback(self._icon_tasks.discard)
+
+
+    def prefetch_report(self) -> Optional[str]:
+        return self._prefetcher.report() if self.prefetch_en else None
+
+
+    async def _fetch_zhanli(self, hero: str, type: str, meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """快照刷新使用的单个英雄请求，不经过响应缓存"""
+        params = {"hero": hero, "type": type, "apikey": self.nyapi_token}
+        data = await self._base_request(
+            "gok_zhanli", "GET", params=params, meta=meta, priority=PRIORITY_BACKGROUND, use_cache=False
+        )
+        info = data.get("info") if isinstance(data, dict) else None
+        return info if isinstance(info, dict) else None
+
+
+    def resolve_hero(self, text: str, return_data: Dict[str, Any]) -> Optional[str]:
+        """
+        英雄名称、别名、拼音解析为标准名称。
+
+        无法解析时在 return_data["msg"] 中写入提示。输入是完整的中文名称时仍原样返回，
+        交给上游确认（可能是本地列表中还没有的新英雄）；否则返回 None，不再请求上游。
+        """
+        hero = self._heroes.resolve(text)
+        if hero:
+            return hero
+
+        suggestions = self._heroes.suggest(text)
+        if suggestions:
+            return_data["msg"] = f"未找到英雄：{text}，你是不是要找：{'、'.join(suggestions)}"
+        else:
+            return_data["msg"] = f"未找到英雄：{text}，请输入英雄名称、别名或拼音"
+
+        name = str(text).strip()
+        if 1 < len(name) <= 8 and all("\u4e00" <= ch <= "\u9fff" for ch in name):
+            logger.info(f"英雄不在本地列表中，直接向上游查询: {name}")
+            return name
+        return None
+
+
+    async def _learn_hero(self, name: str):
+        """上游确认存在的新英雄加入索引和补充列表，之后也会进入上榜战力快照"""
+        if not self._heroes.add({"name": name}):
+            return
+        logger.info(f"发现本地列表中没有的英雄，已加入补充列表: {name}")
+        known = set(self._heroes.names)
+
+        def save():
+            heroes = []
+            if self._hero_extra.exists():
+                with open(self._hero_extra, "r", encoding="utf-8") as f:
+                    heroes = [h for h in json.load(f).get("heroes", []) if h.get("name") in known]
+            heroes.append({"name": name})
+            self._hero_extra.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._hero_extra, "w", encoding="utf-8") as f:
+                json.dump({"heroes": heroes}, f, ensure_ascii=False, indent=2)
+
+        try:
+            await asyncio.to_thread(save)
+        except Exception as e:
+            logger.warning(f"保存英雄补充列表失败: {e}")
+
+
+    @staticmethod
+    def _format_zhanli(row: Dict[str, Any]) -> str:
+        msg = "英雄的最低上榜地区战力\n"
+        msg += f"英雄：{row['hero']}\n"
+        msg += f"省标：{row['province']}--战力：{row['province_power']}\n"
+        msg += f"市标：{row['city']}--战力：{row['city_power']}\n"
+        msg += f"区标：{row['area']}--战力：{row['area_power']}\n"
+        msg += f"数据更新时间：{row['updatetime']}\n"
+        return msg
+
+
     async def zhanli(self,hero: str, type: str):
         return_data = self._init_return_data()
         # 获取配置中的 Token
@@ -466,30 +1321,102 @@ class GOKServer:
             return_data["msg"] = "系统未配置API访问Token"
             return return_data
 
+        if type not in REGION_TYPES:
+            return_data["msg"] = f"大区参数错误，可选：{' '.join(REGION_TYPES)}"
+            return return_data
+
+        hero = self.resolve_hero(hero, return_data)
+        if not hero:
+            return return_data
+        unknown = hero not in self._heroes
+
+        # 启用快照时优先读本地数据
+        if self.snapshot_en:
+            try:
+                row = await self._power.get(hero, type)
+            except Exception as e:
+                logger.error(f"读取上榜战力快照出错: {e}")
+                row = None
+            if row:
+                return_data["data"] = self._format_zhanli(row)
+                # 超过刷新周期仍未更新（上游不可用或刷新被跳过）时提示数据时间
+                if time.time() - row["fetched_at"] >= self._power.interval:
+                    return_data["as_of"] = row["fetched_at"]
+                    return_data["as_of_reason"] = "上榜战力快照暂未刷新"
+                return_data["code"] = 200
+                return return_data
+
         #更新参数
         params = {"hero": hero, "type": type, "apikey": self.nyapi_token}
 
         # 获取数据
-        data: Optional[List[Dict[str, Any]]] = await self._base_request("gok_zhanli", "GET", params=params)   
+        meta = {}
+        data: Optional[List[Dict[str, Any]]] = await self._base_request("gok_zhanli", "GET", params=params, meta=meta)   
         
         if not data:
-            return_data["msg"] = "获取接口信息失败"
+            # 本地列表外的名称上游也查不到时，保留 resolve_hero 给出的候选提示
+            if not unknown or meta.get("busy") or meta.get("unavailable"):
+                return_data["msg"] = self._fail_msg(meta)
             return  return_data  
+        if "as_of" in meta:
+            return_data["as_of"] = meta["as_of"]
 
         try:
-            data0 = data['info']
-            msg = "英雄的最低上榜地区战力\n"
-            msg += f"英雄：{data0['name']}\n"
-            msg += f"省标：{data0['province']}--战力：{data0['provincePower']}\n"
-            msg += f"市标：{data0['city']}--战力：{data0['cityPower']}\n"
-            msg += f"区标：{data0['area']}--战力：{data0['areaPower']}\n"
-            msg += f"数据更新时间：{data0['updatetime']}\n"
-            return_data["data"] = msg
+            if unknown and not (isinstance(data.get("info"), dict) and data["info"].get("updatetime")):
+                return return_data
+            row = HeroPowerStore.to_row(hero, type, data['info'])
+            return_data["data"] = self._format_zhanli(row)
         except Exception as e:
             logger.error(f"处理数据时出错: {e}")
             return_data["msg"] = "处理接口返回信息时出错"
             return  return_data
 
+        if unknown:
+            await self._learn_hero(hero)
+
+        # 快照中缺少的英雄顺带写入
+        if self.snapshot_en and "as_of" not in meta:
+            try:
+                await self._power.put(row)
+            except Exception as e:
+                logger.error(f"写入上榜战力快照出错: {e}")
+
+        return_data["code"] = 200
+
+        return return_data
+
+
+    async def zhanli_rank(self, type: str = "aqq", level: str = "区", limit: int = 10):
+        """战力排行 大区 省/市/区：上榜战力最低的英雄"""
+        return_data = self._init_return_data()
+
+        if not self.snapshot_en:
+            return_data["msg"] = "未启用上榜战力快照，请在插件配置中开启"
+            return return_data
+
+        if type not in REGION_TYPES or level not in LEVELS:
+            return_data["msg"] = f"参数错误，格式：战力排行 大区 省/市/区，大区可选：{' '.join(REGION_TYPES)}"
+            return return_data
+
+        limit = max(1, min(int(limit), 50))
+        try:
+            rows = await self._power.cheapest(type, level, limit)
+        except Exception as e:
+            logger.error(f"读取上榜战力快照出错: {e}")
+            return_data["msg"] = "读取上榜战力快照失败"
+            return return_data
+
+        if not rows:
+            return_data["msg"] = "上榜战力快照尚未生成，请稍后再试"
+            return return_data
+
+        prefix = LEVELS[level]
+        msg = f"{type} {level}标最低上榜战力 前{len(rows)}名\n"
+        for i, row in enumerate(rows, 1):
+            msg += f"{i}. {row['hero']}：{row[prefix + '_power']}（{row[prefix]}）\n"
+        msg += f"数据更新时间：{max(str(row['updatetime']) for row in rows)}\n"
+
+        return_data["data"] = msg
         return_data["code"] = 200
 
         return return_data
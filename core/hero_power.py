@@ -0,0 +1,195 @@
+# pyright: reportOptionalMemberAccess=false
+
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from .sqlite import AsyncSQLiteDB
+
+
+# 上榜战力接口支持的大区：安卓QQ、安卓微信、苹果QQ、苹果微信
+REGION_TYPES = ("aqq", "awx", "iqq", "iwx")
+
+# 榜单级别 -> 字段前缀
+LEVELS = {"省": "province", "市": "city", "区": "area"}
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(float(str(value).strip()))
+    except (TypeError, ValueError):
+        return None
+
+
+class HeroPowerStore:
+    """
+    英雄最低上榜战力快照
+
+    后台按英雄 × 大区定期拉取，保存在 hero_power 表，查询直接读本地。
+    每轮刷新先探测一个英雄，上游更新时间没有变化时跳过整轮，
+    避免在上游两次更新之间重复请求全部数据。
+    """
+
+    # 插件启动后等待多久开始第一轮刷新
+    START_DELAY = 30
+
+    def __init__(
+        self,
+        sqlite: AsyncSQLiteDB,
+        fetch: Callable[[str, str, Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]],
+        heroes: List[str],
+        interval: float = 6 * 3600,
+        concurrency: int = 2
+    ):
+        """
+        :param fetch: 请求单个英雄的函数 fetch(hero, type, meta)，返回接口中的 info 字段。
+        :param interval: 数据超过此秒数后重新拉取。
+        :param concurrency: 同时进行的请求数。
+        """
+        self._sql_db = sqlite
+        self._fetch = fetch
+        self.heroes = heroes
+        self.interval = max(600, float(interval))
+        self.concurrency = max(1, int(concurrency))
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "rounds": 0,
+            "skipped": 0,
+            "fetched": 0,
+            "failed": 0,
+        }
+
+    # ======================
+    # 后台刷新
+    # ======================
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"上榜战力快照已启用，共 {len(self.heroes)} 个英雄，刷新间隔 {self.interval / 3600:.1f} 小时")
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        await asyncio.sleep(self.START_DELAY)
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"刷新上榜战力快照出错: {e}")
+            # 每轮之间至少间隔 1/4 个周期，数据到期时间不一致时分批补齐
+            await asyncio.sleep(self.interval / 4)
+
+    async def refresh(self) -> int:
+        """刷新缺失或过期的数据，返回写入条数"""
+        rows = await self._sql_db.fetch_all("SELECT hero, type, updatetime, fetched_at FROM hero_power")
+        known = {(row["hero"], row["type"]): row for row in rows}
+
+        now = time.time()
+        missing: List[Tuple[str, str]] = []
+        expired: List[Tuple[str, str]] = []
+        for hero in self.heroes:
+            for region in REGION_TYPES:
+                row = known.get((hero, region))
+                if row is None:
+                    missing.append((hero, region))
+                elif now - row["fetched_at"] >= self.interval:
+                    expired.append((hero, region))
+
+        if not missing and not expired:
+            return 0
+
+        # 只有过期数据时先探测一条，上游未更新则跳过本轮；已更新时探测结果直接入库，不再重复请求
+        probed: List[Dict[str, Any]] = []
+        if expired and not missing:
+            hero, region = expired[0]
+            meta: Dict[str, Any] = {}
+            info = await self._fetch(hero, region, meta)
+            if info and str(info.get("updatetime")) == str(known[(hero, region)]["updatetime"]):
+                self._stats["skipped"] += 1
+                logger.debug(f"上榜战力上游未更新（{info.get('updatetime')}），跳过本轮刷新")
+                return 0
+            if info:
+                probed.append(self.to_row(hero, region, info))
+                expired = expired[1:]
+
+        self._stats["rounds"] += 1
+        pending = missing + expired
+        semaphore = asyncio.Semaphore(self.concurrency)
+        aborted = False
+
+        async def one(hero: str, region: str) -> Optional[Dict[str, Any]]:
+            nonlocal aborted
+            async with semaphore:
+                if aborted:
+                    return None
+                meta: Dict[str, Any] = {}
+                info = await self._fetch(hero, region, meta)
+                # 上游熔断时放弃本轮剩余请求
+                if meta.get("unavailable"):
+                    aborted = True
+                if not info:
+                    self._stats["failed"] += 1
+                    return None
+                return self.to_row(hero, region, info)
+
+        results = await asyncio.gather(*(one(hero, region) for hero, region in pending))
+        fresh = probed + [row for row in results if row]
+        if fresh:
+            await self._sql_db.upsert_many("hero_power", fresh, conflict="hero, type")
+        self._stats["fetched"] += len(fresh)
+
+        logger.info(f"上榜战力快照刷新完成：{len(fresh)}/{len(pending) + len(probed)} 条{'（上游不可用，提前结束）' if aborted else ''}")
+        return len(fresh)
+
+    # ======================
+    # 读写
+    # ======================
+
+    @staticmethod
+    def to_row(hero: str, region: str, info: Dict[str, Any]) -> Dict[str, Any]:
+        """接口返回的 info 转为表中的一行"""
+        return {
+            "hero": hero,
+            "type": region,
+            "province": info.get("province"),
+            "province_power": _to_int(info.get("provincePower")),
+            "city": info.get("city"),
+            "city_power": _to_int(info.get("cityPower")),
+            "area": info.get("area"),
+            "area_power": _to_int(info.get("areaPower")),
+            "updatetime": info.get("updatetime"),
+            "fetched_at": time.time(),
+        }
+
+    async def get(self, hero: str, region: str) -> Optional[Dict[str, Any]]:
+        return await self._sql_db.fetch_one(
+            "SELECT * FROM hero_power WHERE hero=? AND type=?",
+            (hero, region)
+        )
+
+    async def put(self, row: Dict[str, Any]):
+        """写入一条实时查询到的数据"""
+        await self._sql_db.upsert_many("hero_power", [row], conflict="hero, type")
+
+    async def cheapest(self, region: str, level: str = "区", limit: int = 10) -> List[Dict[str, Any]]:
+        """指定大区中上榜战力最低的英雄"""
+        column = f"{LEVELS[level]}_power"
+        return await self._sql_db.fetch_all(
+            f"SELECT * FROM hero_power WHERE type=? AND {column} IS NOT NULL ORDER BY {column} ASC LIMIT ?",
+            (region, int(limit))
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "heroes": len(self.heroes), "running": bool(self._task and not self._task.done())}
@@ -0,0 +1,127 @@
+import json
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from .user_index import normalize_name
+
+
+# 英雄列表，包含拼音、首字母和常用别名
+HERO_FILE = Path(__file__).parent.parent / "data" / "heroes.json"
+
+
+def _grams(text: str) -> Set[str]:
+    """双字 n-gram；中文再加上单字，错一个字时也能匹配"""
+    grams = {text[i:i + 2] for i in range(len(text) - 1)}
+    grams.update(ch for ch in text if not ch.isascii())
+    return grams or {text}
+
+
+class HeroIndex:
+    """
+    英雄名称索引
+
+    名称、别名、全拼、首字母都作为查询键。先精确匹配，再按前缀匹配
+    （有序键表 + 二分查找），前缀只对应一个英雄时才算命中。
+    未命中时按 n-gram 重合度给出相近的英雄。
+    内置列表之外、经上游确认存在的新英雄通过 add 加入，并保存在插件数据目录的补充列表中。
+    """
+
+    # 拼音前缀最少字符数，避免单个字母匹配过多
+    MIN_ASCII_PREFIX = 2
+
+    def __init__(self, heroes: List[Dict[str, Any]]):
+        self.names: List[str] = []
+        # 查询键 -> 英雄名称，同一个键对应多个英雄时不能直接解析
+        self._keys: Dict[str, Set[str]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+
+        for hero in heroes:
+            self._index(hero)
+        self._sorted = sorted(self._keys)
+
+    def _index(self, hero: Dict[str, Any]) -> bool:
+        name = hero.get("name")
+        if not name or name in self.names:
+            return False
+        self.names.append(name)
+        for key in [name, hero.get("pinyin"), hero.get("initials"), *(hero.get("aliases") or [])]:
+            if key:
+                key = normalize_name(key)
+                self._keys.setdefault(key, set()).add(name)
+                for gram in _grams(key):
+                    self._grams.setdefault(gram, set()).add(name)
+        return True
+
+    def add(self, hero: Dict[str, Any]) -> bool:
+        """加入一个英雄，已存在时返回 False"""
+        if not self._index(hero):
+            return False
+        self._sorted = sorted(self._keys)
+        return True
+
+    @classmethod
+    def load(cls, path: Path = HERO_FILE, extra: Optional[Path] = None) -> "HeroIndex":
+        """加载内置列表，extra 为补充列表（不存在时忽略）"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        heroes = data.get("heroes", [])
+        if extra and Path(extra).exists():
+            with open(extra, "r", encoding="utf-8") as f:
+                heroes = heroes + json.load(f).get("heroes", [])
+        return cls(heroes)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._keys.get(normalize_name(name), ())
+
+    def _prefixed(self, key: str, limit: int = 50) -> Set[str]:
+        """以 key 开头的查询键对应的英雄"""
+        found: Set[str] = set()
+        i = bisect_left(self._sorted, key)
+        while i < len(self._sorted) and self._sorted[i].startswith(key) and len(found) < limit:
+            found |= self._keys[self._sorted[i]]
+            i += 1
+        return found
+
+    def resolve(self, text: str) -> Optional[str]:
+        """解析为英雄标准名称，无法唯一确定时返回 None"""
+        key = normalize_name(text)
+        if not key:
+            return None
+
+        names = self._keys.get(key)
+        if names:
+            return next(iter(names)) if len(names) == 1 else None
+
+        if key.isascii() and len(key) < self.MIN_ASCII_PREFIX:
+            return None
+        names = self._prefixed(key, limit=2)
+        return next(iter(names)) if len(names) == 1 else None
+
+    def suggest(self, text: str, limit: int = 3) -> List[str]:
+        """给出相近的英雄名称"""
+        key = normalize_name(text)
+        if not key:
+            return []
+
+        # 精确或前缀对应多个英雄时，全部作为候选
+        candidates = self._keys.get(key) or self._prefixed(key)
+        if candidates:
+            return sorted(candidates, key=self.names.index)[:limit]
+
+        scores: Dict[str, int] = {}
+        for gram in _grams(key):
+            for name in self._grams.get(gram, ()):
+                scores[name] = scores.get(name, 0) + 1
+        if not scores:
+            return []
+        # 只保留重合度不低于最佳结果一半的候选
+        best = max(scores.values())
+        ranked = sorted(
+            (kv for kv in scores.items() if kv[1] * 2 >= best),
+            key=lambda kv: (-kv[1], self.names.index(kv[0]))
+        )
+        return [name for name, _ in ranked[:limit]]
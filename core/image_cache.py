@@ -0,0 +1,177 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from astrbot.api import logger
+
+from .sqlite import AsyncSQLiteDB
+from .request import DownloadResult
+
+
+@dataclass
+class ImageEntry:
+    gokid: int
+    path: Path
+    size: int
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    accessed_at: float
+
+
+class ImageCache:
+    """
+    资料图片磁盘缓存
+
+    图片按营地ID保存在本地目录，元数据记录在 image_cache 表。
+    TTL 内直接使用本地文件；过期后带 ETag / Last-Modified 做条件请求，
+    上游返回 304 时只刷新时间。总大小超过预算时按最近访问时间淘汰。
+    """
+
+    # 访问时间写回数据库的最小间隔，避免每次命中都写库
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, sqlite: AsyncSQLiteDB, directory: Path, ttl: float = 600, max_bytes: int = 200 * 1024 * 1024):
+        self._sql_db = sqlite
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # 按访问时间从旧到新排列
+        self._entries: "OrderedDict[int, ImageEntry]" = OrderedDict()
+        self._total = 0
+        self._stats = {
+            "hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+
+    async def load(self):
+        """加载缓存索引，清理丢失的文件，收录没有记录的旧图片"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        rows = await self._sql_db.fetch_all("SELECT * FROM image_cache ORDER BY accessed_at")
+
+        missing = []
+        for row in rows:
+            path = Path(row["path"])
+            if not path.exists():
+                missing.append((row["gokid"],))
+                continue
+            self._entries[row["gokid"]] = ImageEntry(
+                row["gokid"], path, row["size"], row["etag"], row["last_modified"],
+                row["fetched_at"], row["accessed_at"]
+            )
+        if missing:
+            await self._sql_db.executemany("DELETE FROM image_cache WHERE gokid=?", missing)
+
+        # 旧版本直接保存的图片没有元数据，按文件修改时间收录
+        adopted = []
+        for path in self.directory.glob("*.jpg"):
+            try:
+                gokid = int(path.stem)
+            except ValueError:
+                continue
+            if gokid in self._entries:
+                continue
+            stat = path.stat()
+            entry = ImageEntry(gokid, path, stat.st_size, None, None, stat.st_mtime, stat.st_mtime)
+            adopted.append(entry)
+        for entry in adopted:
+            self._entries[entry.gokid] = entry
+            await self._save(entry)
+        # 收录的旧图片访问时间最早，重新排序保证淘汰顺序正确
+        self._entries = OrderedDict(sorted(self._entries.items(), key=lambda kv: kv[1].accessed_at))
+
+        self._total = sum(e.size for e in self._entries.values())
+        await self._evict()
+        logger.info(f"资料图片缓存已加载 {len(self._entries)} 张，共 {self._total / 1024 / 1024:.1f}MB")
+
+    def path_for(self, gokid: int) -> Path:
+        return self.directory / f"{int(gokid)}.jpg"
+
+    def get(self, gokid: int) -> Optional[ImageEntry]:
+        return self._entries.get(int(gokid))
+
+    def is_fresh(self, entry: ImageEntry) -> bool:
+        return time.time() - entry.fetched_at <= self.ttl
+
+    def conditional_headers(self, entry: Optional[ImageEntry]) -> Dict[str, str]:
+        headers = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    async def hit(self, entry: ImageEntry):
+        """TTL 内命中"""
+        self._stats["hits"] += 1
+        await self._touch(entry)
+
+    async def revalidated(self, entry: ImageEntry, result: DownloadResult):
+        """条件请求返回 304，刷新获取时间"""
+        self._stats["revalidated"] += 1
+        entry.fetched_at = time.time()
+        entry.etag = result.etag or entry.etag
+        entry.last_modified = result.last_modified or entry.last_modified
+        await self._touch(entry, force=True)
+
+    async def record(self, gokid: int, result: DownloadResult):
+        """新下载的图片入库，超出预算时淘汰"""
+        self._stats["misses"] += 1
+        gokid = int(gokid)
+        old = self._entries.pop(gokid, None)
+        if old:
+            self._total -= old.size
+
+        now = time.time()
+        entry = ImageEntry(gokid, result.path, result.size, result.etag, result.last_modified, now, now)
+        self._entries[gokid] = entry
+        self._total += entry.size
+        await self._save(entry)
+        await self._evict(keep=gokid)
+
+    async def _touch(self, entry: ImageEntry, force: bool = False):
+        now = time.time()
+        persist = force or now - entry.accessed_at > self.TOUCH_INTERVAL
+        entry.accessed_at = now
+        self._entries.move_to_end(entry.gokid)
+        if persist:
+            await self._save(entry)
+
+    async def _save(self, entry: ImageEntry):
+        await self._sql_db.execute(
+            "INSERT OR REPLACE INTO image_cache (gokid, path, size, etag, last_modified, fetched_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entry.gokid, str(entry.path), entry.size, entry.etag, entry.last_modified, entry.fetched_at, entry.accessed_at)
+        )
+
+    async def _evict(self, keep: Optional[int] = None):
+        """按最近访问时间淘汰，直到总大小不超过预算"""
+        removed = []
+        for gokid in list(self._entries.keys()):
+            if self._total <= self.max_bytes:
+                break
+            if gokid == keep:
+                continue
+            entry = self._entries.pop(gokid)
+            self._total -= entry.size
+            removed.append((gokid,))
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        if removed:
+            self._stats["evictions"] += len(removed)
+            await self._sql_db.executemany("DELETE FROM image_cache WHERE gokid=?", removed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "count": len(self._entries),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+        }
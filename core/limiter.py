@@ -0,0 +1,199 @@
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+
+# 请求优先级，数值越小越优先
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class APIBusyError(Exception):
+    """请求队列已满或预计等待过久，直接拒绝"""
+
+
+class LimiterClosedError(RuntimeError):
+    """限流器已关闭（插件重载或停止），排队中的请求不再发出"""
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(0.01, float(rate))
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def refund(self):
+        """归还一个未使用的令牌"""
+        self._tokens = min(self.burst, self._tokens + 1)
+
+    def try_acquire(self) -> float:
+        """拿到令牌返回 0，否则返回需要等待的秒数"""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class HostLimiter:
+    """
+    单个上游主机的限流器
+
+    令牌桶控制速率，拿不到令牌的请求按优先级排队。
+    队列已满或预计等待超过 max_wait 时直接抛出 APIBusyError。
+    """
+
+    def __init__(self, host: str, rate: float, burst: int, max_queue: int = 50, max_wait: float = 5.0):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.max_queue = max(1, int(max_queue))
+        self.max_wait = max_wait
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+        self._closed = False
+        self._stats = {
+            "acquired": 0,
+            "queued": 0,
+            "rejected": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+        }
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """等待令牌，返回排队耗时（秒）"""
+        if self._closed:
+            raise LimiterClosedError(f"{self.host} 限流器已关闭")
+        if not self._queue and self.bucket.try_acquire() == 0:
+            self._stats["acquired"] += 1
+            return 0.0
+
+        # 后台请求最多占用一半队列，且不受等待时间限制
+        if priority >= PRIORITY_BACKGROUND:
+            if len(self._queue) >= self.max_queue // 2:
+                self._stats["rejected"] += 1
+                raise APIBusyError(f"{self.host} 后台请求队列已满")
+        else:
+            # 预计等待：前面排队的请求（优先级不低于自己的）都要先拿到令牌
+            ahead = sum(1 for p, _, f in self._queue if p <= priority and not f.done())
+            estimate = (ahead + 1 - self.bucket.tokens) / self.bucket.rate
+            if len(self._queue) >= self.max_queue or estimate > self.max_wait:
+                self._stats["rejected"] += 1
+                raise APIBusyError(f"{self.host} 请求繁忙，预计等待 {estimate:.1f}s")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self._stats["queued"] += 1
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+
+        start = time.monotonic()
+        await future
+        waited = time.monotonic() - start
+        self._stats["acquired"] += 1
+        self._stats["wait_total"] += waited
+        self._stats["wait_max"] = max(self._stats["wait_max"], waited)
+        return waited
+
+    async def _run(self):
+        """按优先级依次发放令牌"""
+        while self._queue:
+            wait = self.bucket.try_acquire()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            # 跳过已取消的等待者，令牌留给下一个
+            while self._queue:
+                _, _, future = heapq.heappop(self._queue)
+                if not future.done():
+                    future.set_result(None)
+                    break
+            else:
+                self.bucket.refund()
+
+    def close(self):
+        """停止发放令牌；排队中的请求以 LimiterClosedError 结束，而不是取消调用方"""
+        self._closed = True
+        if self._pump and not self._pump.done():
+            self._pump.cancel()
+        for _, _, future in self._queue:
+            if not future.done():
+                future.set_exception(LimiterClosedError(f"{self.host} 限流器已关闭"))
+        self._queue.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        acquired = self._stats["acquired"]
+        return {
+            **self._stats,
+            "wait_avg": round(self._stats["wait_total"] / acquired, 4) if acquired else 0.0,
+            "queue": len(self._queue),
+            "tokens": round(self.bucket.tokens, 2),
+        }
+
+
+class RateLimiter:
+    """按主机划分的限流器集合"""
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: int = 5,
+        max_queue: int = 50,
+        max_wait: float = 5.0,
+        overrides: Optional[Dict[str, Tuple[float, int]]] = None
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.overrides = overrides or {}
+        self._hosts: Dict[str, HostLimiter] = {}
+
+    @staticmethod
+    def parse_overrides(items: List[str]) -> Dict[str, Tuple[float, int]]:
+        """解析 "主机=速率/突发" 格式的配置，例如 api.t1qq.com=2/5"""
+        overrides = {}
+        for item in items or []:
+            try:
+                host, _, value = str(item).partition("=")
+                rate, _, burst = value.partition("/")
+                overrides[host.strip()] = (float(rate), int(burst or 1))
+            except ValueError:
+                logger.warning(f"限流配置无效：{item}")
+        return overrides
+
+    def host(self, host: str) -> HostLimiter:
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            rate, burst = self.overrides.get(host, (self.rate, self.burst))
+            limiter = HostLimiter(host, rate, burst, self.max_queue, self.max_wait)
+            self._hosts[host] = limiter
+        return limiter
+
+    async def acquire(self, host: str, priority: int = PRIORITY_INTERACTIVE) -> float:
+        return await self.host(host).acquire(priority)
+
+    def close(self):
+        for limiter in self._hosts.values():
+            limiter.close()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {host: limiter.stats() for host, limiter in self._hosts.items()}
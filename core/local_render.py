@@ -0,0 +1,197 @@
+import os
+import time
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from astrbot.api import logger
+
+from . import draw
+
+
+# 渲染后端
+BACKEND_HTML = "html"
+BACKEND_LOCAL = "local"
+
+
+class LocalRenderer:
+    """
+    本地图片渲染
+
+    用 Pillow 在子进程池中绘制图片，不占用事件循环，也不依赖文转图服务。
+    只支持 draw.DRAWERS 中的模板，其余模板仍走 html_render。
+    输出的图片保存在 directory 下，超过 keep 秒的旧文件定期清理。
+    """
+
+    # 每渲染多少次清理一次旧文件
+    PRUNE_EVERY = 50
+
+    def __init__(self, directory: Path, fonts: Optional[Dict[str, str]], workers: int = 2, keep: float = 7200):
+        self.directory = Path(directory)
+        self.icon_dir = self.directory / "icons"
+        self.fonts = fonts
+        self.workers = max(1, int(workers))
+        self.keep = keep
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._renders = 0
+        self._stats = {
+            "renders": 0,
+            "errors": 0,
+            "time_total": 0.0,
+        }
+
+    @classmethod
+    def create(cls, directory: Path, font: str = "", bold_font: str = "", workers: int = 2, keep: float = 7200):
+        """Pillow 或中文字体缺失时返回 None"""
+        if not draw.available():
+            logger.info("未安装 Pillow，本地渲染不可用")
+            return None
+        fonts = draw.find_fonts(font, bold_font)
+        if not fonts:
+            logger.warning("未找到可用的中文字体，本地渲染不可用，可在配置中指定字体文件路径")
+            return None
+        return cls(directory, fonts, workers, keep)
+
+    def supports(self, template: Optional[str]) -> bool:
+        return template in draw.DRAWERS
+
+    async def start(self):
+        # 启动子进程会阻塞，放到线程中执行
+        await asyncio.to_thread(self._start_pool)
+        logger.info(f"本地渲染已启用，字体：{self.fonts['regular']}，进程数 {self.workers}")
+
+    def _start_pool(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.icon_dir.mkdir(parents=True, exist_ok=True)
+        # 插件进程中已有 aiosqlite 等线程，fork 出的子进程可能继承被占用的锁而死锁。
+        # 用 forkserver 从单线程的服务进程派生子进程（预先导入绘图模块），不支持时用 spawn
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload([draw.__name__])
+        else:
+            context = multiprocessing.get_context("spawn")
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=draw.init_worker,
+            initargs=(self.fonts,)
+        )
+        # 提前拉起子进程，避免首次渲染等待进程启动
+        for _ in range(self.workers):
+            self._pool.submit(draw.available)
+
+    async def close(self):
+        if self._pool:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, True, cancel_futures=True)
+        logger.info(f"本地渲染统计: {self.stats()}")
+
+    async def render(self, template: str, data: Dict[str, Any]) -> str:
+        """在子进程中绘制，返回本地图片路径"""
+        if self._pool is None:
+            raise RuntimeError("本地渲染进程池未启动")
+
+        name = hashlib.sha1(f"{template}:{time.time_ns()}:{id(data)}".encode("utf-8")).hexdigest()
+        out_path = str(self.directory / f"{name}.jpg")
+        start = time.perf_counter()
+        try:
+            path = await asyncio.get_running_loop().run_in_executor(
+                self._pool, draw.render_file, template, data, out_path, self.fonts, str(self.icon_dir)
+            )
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        self._stats["renders"] += 1
+        self._stats["time_total"] += time.perf_counter() - start
+
+        self._renders += 1
+        if self._renders % self.PRUNE_EVERY == 0:
+            await asyncio.to_thread(self._prune)
+        return path
+
+    def _prune(self):
+        """删除超过保留时间的渲染结果"""
+        deadline = time.time() - self.keep
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".jpg"):
+                try:
+                    if entry.stat().st_mtime < deadline:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    # ======================
+    # 图标
+    # ======================
+
+    def missing_icons(self, template: str, data: Dict[str, Any]) -> List[str]:
+        """模板用到、但本地还没有的图标地址"""
+        if template != "wangzhezhanji.html":
+            return []
+        urls: Set[str] = set()
+        for m in data.get("data") or []:
+            for key in ("heroIcon", "evaluateUrlV3", "mvpUrlV3"):
+                url = m.get(key)
+                if url and str(url).startswith("http"):
+                    urls.add(str(url))
+        return [url for url in urls if not draw.icon_path(self.icon_dir, url).exists()]
+
+    def stats(self) -> Dict[str, Any]:
+        renders = self._stats["renders"]
+        return {
+            **self._stats,
+            "time_avg": round(self._stats["time_total"] / renders, 4) if renders else 0.0,
+        }
+
+
+class BackendSelector:
+    """
+    按模板选择渲染后端
+
+    记录每个 (模板, 后端) 耗时的指数滑动平均。auto 模式下先让每个后端各渲染几次，
+    之后使用平均耗时更短的后端，并每隔 PROBE_EVERY 次用另一个后端试一次，跟上两边的变化。
+    """
+
+    SAMPLES = 3
+    PROBE_EVERY = 20
+    ALPHA = 0.3
+    # 渲染失败按此耗时（秒）计入
+    FAILURE_PENALTY = 30.0
+
+    def __init__(self, mode: str = "auto"):
+        self.mode = mode if mode in ("auto", BACKEND_HTML, BACKEND_LOCAL) else "auto"
+        # (模板, 后端) -> (平均耗时, 次数)
+        self._latency: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._count: Dict[str, int] = {}
+
+    def choose(self, template: str, backends: Iterable[str]) -> str:
+        backends = list(backends)
+        if self.mode != "auto":
+            return self.mode if self.mode in backends else backends[0]
+
+        # 样本不足的后端优先
+        for backend in backends:
+            if self._latency.get((template, backend), (0.0, 0))[1] < self.SAMPLES:
+                return backend
+
+        ranked = sorted(backends, key=lambda b: self._latency[(template, b)][0])
+        n = self._count[template] = self._count.get(template, 0) + 1
+        if len(ranked) > 1 and n % self.PROBE_EVERY == 0:
+            return ranked[1]
+        return ranked[0]
+
+    def observe(self, template: str, backend: str, seconds: float):
+        avg, n = self._latency.get((template, backend), (seconds, 0))
+        self._latency[(template, backend)] = (avg + (seconds - avg) * self.ALPHA if n else seconds, n + 1)
+
+    def failed(self, template: str, backend: str):
+        self.observe(template, backend, self.FAILURE_PENALTY)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        result: Dict[str, Dict[str, Any]] = {}
+        for (template, backend), (avg, n) in sorted(self._latency.items()):
+            result.setdefault(template, {})[backend] = {"avg_ms": round(avg * 1000, 1), "count": n}
+        return result
@@ -0,0 +1,123 @@
+# pyright: reportOptionalMemberAccess=false
+
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from .sqlite import AsyncSQLiteDB
+
+
+# 上游可能返回的对局时间格式
+GAMETIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M")
+
+
+def normalize_gametime(value) -> Optional[str]:
+    """
+    对局时间统一为 YYYY-MM-DD HH:MM:SS，入库和比较都用这个格式
+
+    支持常见的日期字符串和秒/毫秒时间戳，无法识别时原样返回。
+    """
+    if value is None or value == "":
+        return None
+    text = str(value).strip()
+    try:
+        if isinstance(value, (int, float)) or text.isdigit():
+            ts = float(text)
+            if ts > 1e12:
+                ts /= 1000
+            return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+        for fmt in GAMETIME_FORMATS:
+            try:
+                return datetime.strptime(text, fmt).strftime("%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                continue
+        return datetime.fromisoformat(text).strftime("%Y-%m-%d %H:%M:%S")
+    except (ValueError, OverflowError, OSError):
+        return text
+
+
+class MatchStore:
+    """
+    本地对局历史
+
+    每次拉取到的战绩列表按 (gokid, option, gametime) 合并入库，
+    只写入比本地最新一局更新的对局，查询直接读本地数据。
+    gametime 入库前统一格式，排序和比较不依赖上游的字符串格式。
+    按每个角色的条数和保存天数限制数据量，定期压缩数据库。
+    """
+
+    def __init__(self, sqlite: AsyncSQLiteDB, max_per_player: int = 500, max_age_days: float = 180):
+        self._sql_db = sqlite
+        self.max_per_player = max(25, int(max_per_player))
+        self.max_age_days = max_age_days
+
+    async def latest(self, gokid: int, option: str) -> Optional[Tuple[str, float]]:
+        """本地最新一局的 (gametime, 入库时间)"""
+        row = await self._sql_db.fetch_one(
+            "SELECT gametime, fetched_at FROM matches WHERE gokid=? AND option=? ORDER BY gametime DESC LIMIT 1",
+            (int(gokid), str(option))
+        )
+        return (row["gametime"], row["fetched_at"]) if row else None
+
+    async def merge(self, gokid: int, option: str, rows: List[Dict[str, Any]]) -> int:
+        """
+        合并上游返回的对局列表（按时间倒序），返回新增条数
+        """
+        latest = await self.latest(gokid, option)
+        latest_time = latest[0] if latest else None
+
+        now = time.time()
+        new_rows = []
+        for row in rows:
+            gametime = normalize_gametime(row.get("gametime"))
+            # 不假设上游列表有序，逐条跳过本地已有的对局
+            if gametime is None or (latest_time is not None and gametime <= latest_time):
+                continue
+            new_rows.append((int(gokid), str(option), gametime, json.dumps(row, ensure_ascii=False), now))
+
+        if new_rows:
+            async with self._sql_db.transaction():
+                await self._sql_db.executemany(
+                    "INSERT OR IGNORE INTO matches (gokid, option, gametime, data, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                    new_rows
+                )
+                await self._trim(gokid, option)
+
+        return len(new_rows)
+
+    async def recent(self, gokid: int, option: str, limit: int = 25) -> List[Dict[str, Any]]:
+        """本地最近的对局，按时间倒序"""
+        rows = await self._sql_db.fetch_all(
+            "SELECT data FROM matches WHERE gokid=? AND option=? ORDER BY gametime DESC LIMIT ?",
+            (int(gokid), str(option), int(limit))
+        )
+        return [json.loads(row["data"]) for row in rows]
+
+    async def _trim(self, gokid: int, option: str):
+        """单个角色只保留最近 max_per_player 局"""
+        await self._sql_db.execute(
+            """
+            DELETE FROM matches WHERE gokid=? AND option=? AND gametime NOT IN (
+                SELECT gametime FROM matches WHERE gokid=? AND option=?
+                ORDER BY gametime DESC LIMIT ?
+            )
+            """,
+            (int(gokid), str(option), int(gokid), str(option), self.max_per_player)
+        )
+
+    async def compact(self):
+        """删除超期数据，空闲页过多时整理数据库文件"""
+        if self.max_age_days:
+            await self._sql_db.execute(
+                "DELETE FROM matches WHERE fetched_at < ?",
+                (time.time() - self.max_age_days * 86400,)
+            )
+
+        pages = await self._sql_db.fetch_one("PRAGMA page_count")
+        free = await self._sql_db.fetch_one("PRAGMA freelist_count")
+        if pages and free and pages["page_count"] and free["freelist_count"] / pages["page_count"] > 0.25:
+            logger.info(f"数据库空闲页 {free['freelist_count']}/{pages['page_count']}，执行 VACUUM")
+            await self._sql_db.executescript("VACUUM")
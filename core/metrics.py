@@ -0,0 +1,258 @@
+import os
+import time
+import asyncio
+import functools
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+
+# 直方图分桶上界（秒）
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 当前正在执行的指令，子任务创建时自动继承
+_command: ContextVar[str] = ContextVar("gok_command", default="-")
+
+
+class Histogram:
+    """固定分桶的耗时直方图"""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """按分桶线性插值估算分位数"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(BUCKETS):
+                    return self.max
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = min(BUCKETS[i], self.max)
+                return lower + (upper - lower) * max(0.0, rank - seen) / n
+            seen += n
+        return self.max
+
+
+class _Span:
+    __slots__ = ("_metrics", "_stage", "_start")
+
+    def __init__(self, metrics: "Metrics", stage: str):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe(self._stage, time.perf_counter() - self._start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _CommandScope:
+    """进入指令作用域，结束时记录指令总耗时"""
+
+    __slots__ = ("_metrics", "_name", "_token", "_start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._token = _command.set(self._name)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self._metrics.observe("total", time.perf_counter() - self._start)
+        if exc_type is not None:
+            self._metrics.errors[self._name] = self._metrics.errors.get(self._name, 0) + 1
+        _command.reset(self._token)
+        return False
+
+
+class Metrics:
+    """
+    指令分阶段耗时统计
+
+    指令入口用 command() 建立作用域，各阶段用 span() 或 timed() 计时，
+    耗时按 (指令, 阶段) 记入直方图。未启用时 span() 返回共享的空对象，不做任何计时。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started_at = time.time()
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.errors: Dict[str, int] = {}
+        self._export_task: Optional[asyncio.Task] = None
+
+    def configure(self, enabled: bool):
+        self.enabled = bool(enabled)
+
+    def reset(self):
+        self.started_at = time.time()
+        self.histograms.clear()
+        self.errors.clear()
+
+    # ======================
+    # 计时
+    # ======================
+
+    def command(self, name: str):
+        if not self.enabled:
+            return _NOOP
+        return _CommandScope(self, name)
+
+    def span(self, stage: str):
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, stage)
+
+    def timed(self, stage: str):
+        """异步函数计时装饰器"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return await func(*args, **kwargs)
+                with _Span(self, stage):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, stage: str, seconds: float):
+        key = (_command.get(), stage)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        hist.observe(seconds)
+
+    # ======================
+    # 输出
+    # ======================
+
+    def report(self) -> str:
+        """文本报告：每个指令的总耗时，以及各阶段平均 / p95 / 最大耗时（毫秒）"""
+        if not self.histograms:
+            return "暂无性能数据"
+
+        by_command: Dict[str, List[Tuple[str, Histogram]]] = {}
+        for (command, stage), hist in self.histograms.items():
+            by_command.setdefault(command, []).append((stage, hist))
+
+        minutes = (time.time() - self.started_at) / 60
+        lines = [f"性能统计（最近 {minutes:.0f} 分钟，单位毫秒）"]
+        for command in sorted(by_command, key=lambda c: (c == "-", c)):
+            stages = dict(by_command[command])
+            total = stages.pop("total", None)
+            if total:
+                lines.append(
+                    f"【{command}】{total.count} 次 失败 {self.errors.get(command, 0)} "
+                    f"p50 {total.quantile(0.5) * 1000:.0f} p95 {total.quantile(0.95) * 1000:.0f} "
+                    f"max {total.max * 1000:.0f}"
+                )
+            else:
+                lines.append("【后台】" if command == "-" else f"【{command}】")
+            for stage, hist in sorted(stages.items(), key=lambda kv: -kv[1].sum):
+                lines.append(
+                    f"  {stage}: {hist.count} 次 avg {hist.sum / hist.count * 1000:.1f} "
+                    f"p95 {hist.quantile(0.95) * 1000:.1f} max {hist.max * 1000:.1f}"
+                )
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """Prometheus 文本格式"""
+        def label(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        lines = [
+            "# HELP gok_stage_seconds 指令各阶段耗时",
+            "# TYPE gok_stage_seconds histogram",
+        ]
+        for (command, stage), hist in sorted(self.histograms.items()):
+            labels = f'command="{label(command)}",stage="{label(stage)}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, hist.counts):
+                cumulative += n
+                lines.append(f'gok_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'gok_stage_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+            lines.append(f"gok_stage_seconds_sum{{{labels}}} {hist.sum:.6f}")
+            lines.append(f"gok_stage_seconds_count{{{labels}}} {hist.count}")
+
+        lines += [
+            "# HELP gok_command_errors_total 指令执行异常次数",
+            "# TYPE gok_command_errors_total counter",
+        ]
+        for command, n in sorted(self.errors.items()):
+            lines.append(f'gok_command_errors_total{{command="{label(command)}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path):
+        """原子写入，避免采集端读到写了一半的文件"""
+        tmp = Path(f"{path}.tmp")
+        tmp.write_text(self.prometheus(), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def start_export(self, path: Path, interval: float = 60):
+        """定期把指标写入 Prometheus 文本文件（可配合 node_exporter textfile 采集）"""
+        async def run():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.write_prometheus, path)
+                except Exception as e:
+                    logger.warning(f"写入性能指标文件失败: {e}")
+
+        if self._export_task is None or self._export_task.done():
+            self._export_task = asyncio.create_task(run())
+            logger.info(f"性能指标文件：{path}，每 {interval:.0f} 秒更新")
+
+    async def stop_export(self, path: Optional[Path] = None):
+        if self._export_task and not self._export_task.done():
+            self._export_task.cancel()
+            try:
+                await self._export_task
+            except asyncio.CancelledError:
+                pass
+        self._export_task = None
+        if path:
+            try:
+                await asyncio.to_thread(self.write_prometheus, path)
+            except Exception as e:
+                logger.warning(f"写入性能指标文件失败: {e}")
+
+
+# 全局实例，由插件根据配置启用
+metrics = Metrics()
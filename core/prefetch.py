@@ -0,0 +1,195 @@
+import time
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Tuple
+
+from astrbot.api import logger
+
+
+# warm(gokid, option, budget, meta) -> 实际消耗的请求数；meta 中出现 busy / unavailable 时本轮停止
+WarmFunc = Callable[[int, str, int, Dict[str, Any]], Awaitable[int]]
+
+
+class Prefetcher:
+    """
+    热门角色预取
+
+    按营地ID记录查询热度（按半衰期指数衰减），空闲时后台刷新热度最高的前 N 个角色的
+    对局列表和资料图片，下一次查询直接命中缓存。每小时的预取请求数不超过预算。
+
+    命中率：预取过的数据在有效期内被查询到算命中，过期仍未被查询算浪费。
+    """
+
+    START_DELAY = 30
+    # 热度低于此值的角色不预取（单次查询记 1 分）
+    MIN_SCORE = 1.5
+    # 热度低于此值的记录直接丢弃
+    DROP_SCORE = 0.05
+
+    def __init__(
+        self,
+        warm: WarmFunc,
+        top_n: int = 10,
+        budget: int = 120,
+        half_life: float = 6 * 3600,
+        idle: float = 30,
+        interval: float = 60
+    ):
+        self._warm = warm
+        self.top_n = max(1, int(top_n))
+        self.budget = max(0, int(budget))
+        self.half_life = max(1.0, float(half_life))
+        self.idle = float(idle)
+        self.interval = max(1.0, float(interval))
+        # 营地ID -> (热度, 更新时间)
+        self._scores: Dict[int, Tuple[float, float]] = {}
+        # 营地ID -> 最近一次查询战绩的模式
+        self._options: Dict[int, str] = {}
+        # (类型, 营地ID, 模式) -> 预取数据的过期时间
+        self._warmed: Dict[Tuple[str, int, str], float] = {}
+        # 最近一小时内预取请求的时间
+        self._spent: Deque[float] = deque()
+        self._last_active = 0.0
+        self._task = None
+        self._stats = {
+            "rounds": 0,
+            "requests": 0,
+            "warmed": 0,
+            "hits": 0,
+            "misses": 0,
+            "wasted": 0,
+        }
+
+    # ======================
+    # 生命周期
+    # ======================
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"热门角色预取已启用，前 {self.top_n} 名，每小时最多 {self.budget} 次请求")
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        await asyncio.sleep(self.START_DELAY)
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"热门角色预取出错: {e}")
+            await asyncio.sleep(self.interval)
+
+    # ======================
+    # 热度
+    # ======================
+
+    def _score(self, gokid: int, now: float) -> float:
+        score, updated = self._scores.get(gokid, (0.0, now))
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+    def record(self, kind: str, gokid, option: str = ""):
+        """交互查询时调用：累加热度，并统计是否命中预取的数据"""
+        now = time.time()
+        gokid = int(gokid)
+        self._last_active = now
+        self._scores[gokid] = (self._score(gokid, now) + 1, now)
+        if kind == "zhanji":
+            self._options[gokid] = str(option)
+
+        expires = self._warmed.pop((kind, gokid, str(option)), None)
+        if expires is not None and expires >= now:
+            self._stats["hits"] += 1
+        else:
+            self._stats["misses"] += 1
+            if expires is not None:
+                self._stats["wasted"] += 1
+
+    def warmed(self, kind: str, gokid, option: str, ttl: float):
+        """预取成功后调用，ttl 内的查询计为命中"""
+        self._warmed[(kind, int(gokid), str(option))] = time.time() + ttl
+        self._stats["warmed"] += 1
+
+    def top(self, now: float) -> List[Tuple[int, float]]:
+        """热度最高的前 N 个角色，同时清理热度过低的记录"""
+        scored = []
+        for gokid in list(self._scores):
+            score = self._score(gokid, now)
+            if score < self.DROP_SCORE:
+                del self._scores[gokid]
+                self._options.pop(gokid, None)
+            elif score >= self.MIN_SCORE:
+                scored.append((gokid, score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:self.top_n]
+
+    # ======================
+    # 预取
+    # ======================
+
+    def budget_left(self, now: float) -> int:
+        while self._spent and now - self._spent[0] > 3600:
+            self._spent.popleft()
+        return self.budget - len(self._spent)
+
+    async def run_once(self) -> int:
+        """空闲时预取一轮，返回消耗的请求数"""
+        now = time.time()
+
+        # 过期未被查询的预取计为浪费
+        for key, expires in list(self._warmed.items()):
+            if expires < now:
+                del self._warmed[key]
+                self._stats["wasted"] += 1
+
+        if now - self._last_active < self.idle:
+            return 0
+
+        spent = 0
+        for gokid, _ in self.top(now):
+            budget = self.budget_left(time.time())
+            if budget <= 0:
+                break
+            meta: Dict[str, Any] = {}
+            used = await self._warm(gokid, self._options.get(gokid, "0"), budget, meta)
+            self._spent.extend([time.time()] * used)
+            spent += used
+            if meta.get("busy") or meta.get("unavailable"):
+                logger.info("上游繁忙或不可用，本轮预取提前结束")
+                break
+            # 预取期间有新的查询时让出上游
+            if time.time() - self._last_active < self.idle:
+                break
+
+        if spent:
+            self._stats["rounds"] += 1
+            self._stats["requests"] += spent
+            logger.debug(f"热门角色预取完成，消耗 {spent} 次请求")
+        return spent
+
+    def stats(self) -> Dict[str, Any]:
+        queries = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "tracked": len(self._scores),
+            "budget_left": self.budget_left(time.time()),
+            "hit_rate": round(self._stats["hits"] / queries, 4) if queries else 0.0,
+            "used_rate": round(self._stats["hits"] / self._stats["warmed"], 4) if self._stats["warmed"] else 0.0,
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        return (
+            f"热门角色预取：命中率 {stats['hit_rate'] * 100:.1f}%（{stats['hits']}/{stats['hits'] + stats['misses']}），"
+            f"预取 {stats['warmed']} 份，使用率 {stats['used_rate'] * 100:.1f}%，"
+            f"消耗请求 {stats['requests']} 次，本小时剩余预算 {stats['budget_left']}"
+        )
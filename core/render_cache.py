@@ -0,0 +1,67 @@
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class RenderCache:
+    """
+    文转图结果缓存
+
+    以 (模板, 数据, 渲染参数) 的哈希为键保存渲染得到的图片地址，
+    相同内容不再重复调用文转图服务。条目可以带标签，按标签批量失效。
+    """
+
+    def __init__(self, max_entries: int = 128, ttl: float = 3600):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        # key -> (图片地址, 标签, 写入时间)
+        self._entries: "OrderedDict[str, Tuple[str, Optional[str], float]]" = OrderedDict()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def make_key(template: str, data: Any, options: Optional[Dict[str, Any]] = None) -> str:
+        h = hashlib.sha256()
+        h.update(template.encode("utf-8"))
+        h.update(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        h.update(json.dumps(options or {}, sort_keys=True, default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+
+        url, _, created_at = entry
+        if self.ttl and time.time() - created_at > self.ttl:
+            del self._entries[key]
+            self._stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return url
+
+    def set(self, key: str, url: str, tag: Optional[str] = None):
+        self._entries[key] = (url, tag, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def invalidate(self, tag: str):
+        """删除指定标签的全部条目"""
+        keys = [k for k, (_, t, _) in self._entries.items() if t == tag]
+        for k in keys:
+            del self._entries[k]
+        self._stats["invalidations"] += len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "size": len(self._entries)}
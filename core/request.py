@@ -1,12 +1,50 @@
 # core/request.py
+import os
 import json
+import uuid
 import aiohttp
 import asyncio
-from typing import Optional, Dict, Any, Union, List
-from aiohttp import ClientTimeout, ClientSession
+from pathlib import Path
+from dataclasses import dataclass
+from collections import deque
+from typing import Optional, Dict, Any, Union, List, Callable, Awaitable, AsyncIterator, Deque
+from urllib.parse import urlparse
+from aiohttp import ClientTimeout, ClientSession, TCPConnector
 
 from astrbot.api import logger
 
+from .limiter import RateLimiter, APIBusyError, LimiterClosedError, PRIORITY_INTERACTIVE
+from .breaker import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+@dataclass
+class PoolConfig:
+    """
+    连接池配置
+
+    limit / limit_per_host: 总连接数和单个主机连接数上限
+    ttl_dns_cache: DNS 缓存时间（秒）
+    keepalive_timeout: 空闲连接保持时间（秒）
+    drain_timeout: 关闭时等待进行中请求完成的最长时间（秒）
+    """
+    limit: int = 100
+    limit_per_host: int = 10
+    ttl_dns_cache: int = 300
+    keepalive_timeout: float = 30.0
+    drain_timeout: float = 5.0
+
+
+@dataclass
+class DownloadResult:
+    """流式下载结果"""
+    path: Path
+    size: int
+    content_type: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # 条件请求命中（304），本地文件未改动
+    not_modified: bool = False
+
+
 class APIClient:
     """
     API客户端类
@@ -15,26 +53,103 @@ class APIClient:
     1. 复用 aiohttp.ClientSession 以提高性能。
     2. 增加类型提示 (Type Hints)。
     3. 支持异步上下文管理器 (Async Context Manager)。
+    4. 相同的并发 GET 请求合并为一次上游调用 (Single-flight)。
+    5. 可选的按主机限流，排队时交互请求优先；队列饱和时抛出 APIBusyError。
+    6. GET 失败后指数退避重试，按主机熔断，熔断期间抛出 CircuitOpenError。
+    7. 可配置的连接池，Session 加锁创建，关闭时等待进行中的请求完成。
     """
 
-    def __init__(self, base_timeout: int = 10, ssl_verify: bool = False):
+    def __init__(
+        self,
+        base_timeout: int = 10,
+        ssl_verify: bool = False,
+        limiter: Optional[RateLimiter] = None,
+        retry: Optional[RetryPolicy] = None,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 30.0,
+        pool: Optional[PoolConfig] = None
+    ):
         self.base_timeout = base_timeout
         self.ssl_verify = ssl_verify
+        self.limiter = limiter
+        self.retry = retry or RetryPolicy(deadline=base_timeout)
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.pool = pool or PoolConfig()
         self._session: Optional[ClientSession] = None
+        self._session_lock = asyncio.Lock()
+        self._closing = False
+
+        # 进行中的请求数，按主机统计
+        self._active: Dict[str, int] = {}
+        self._active_peak = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        # 进行中的请求，键为 (method, url, params)，同时记录发起时的优先级
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._inflight_priority: Dict[tuple, int] = {}
+        self._inflight_waiters: Dict[tuple, int] = {}
+        self._flight_stats = {
+            "calls": 0,
+            "upstream": 0,
+            "coalesced": 0,
+            # 交互请求遇到进行中的后台请求时单独发起的次数
+            "bypassed": 0,
+            "max_waiters": 0,
+        }
 
     async def get_session(self) -> ClientSession:
-        """获取或创建单例 Session"""
-        if self._session is None or self._session.closed:
-            timeout = ClientTimeout(total=self.base_timeout)
-            self._session = ClientSession(timeout=timeout)
-        return self._session
+        """获取或创建单例 Session（加锁，避免并发首次调用创建多个）"""
+        session = self._session
+        if session is not None and not session.closed:
+            return session
+
+        async with self._session_lock:
+            if self._session is None or self._session.closed:
+                connector = TCPConnector(
+                    limit=self.pool.limit,
+                    limit_per_host=self.pool.limit_per_host,
+                    ttl_dns_cache=self.pool.ttl_dns_cache,
+                    keepalive_timeout=self.pool.keepalive_timeout,
+                )
+                timeout = ClientTimeout(total=self.base_timeout)
+                self._session = ClientSession(timeout=timeout, connector=connector)
+            return self._session
 
     async def close(self):
-        """关闭 Session"""
-        if self._session and not self._session.closed:
-            await self._session.close()
+        """关闭 Session，先等待进行中的请求完成"""
+        self._closing = True
+        if self.limiter:
+            self.limiter.close()
+
+        if not self._idle.is_set():
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=self.pool.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"等待进行中的请求超时，强制关闭: {self._active}")
+
+        async with self._session_lock:
+            if self._session and not self._session.closed:
+                await self._session.close()
             self._session = None
 
+    def pool_stats(self) -> Dict[str, Any]:
+        """连接池占用情况"""
+        connector = self._session.connector if self._session and not self._session.closed else None
+        # aiohttp 没有公开空闲连接数，读取内部字段仅用于统计
+        idle = sum(len(v) for v in getattr(connector, "_conns", {}).values()) if connector else 0
+        return {
+            "limit": self.pool.limit,
+            "limit_per_host": self.pool.limit_per_host,
+            # 包括正在等待连接池空位的请求
+            "in_flight": sum(self._active.values()),
+            "in_flight_by_host": dict(self._active),
+            "in_flight_peak": self._active_peak,
+            "idle_connections": idle,
+        }
+
     async def __aenter__(self):
         await self.get_session()
         return self
@@ -42,18 +157,216 @@ class APIClient:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.close()
 
-    async def _request(self, method: str, url: str, params: Optional[Dict] = None, json_data: Optional[Dict] = None) -> Any:
+    @staticmethod
+    def _flight_key(method: str, url: str, params: Optional[Dict]) -> tuple:
+        items = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+        return (method, url, items)
+
+    def flight_stats(self) -> Dict[str, Any]:
+        """请求合并统计"""
+        calls = self._flight_stats["calls"]
+        ratio = self._flight_stats["coalesced"] / calls if calls else 0.0
+        return {
+            **self._flight_stats,
+            "inflight": len(self._inflight),
+            "waiters": sum(self._inflight_waiters.values()),
+            "coalescing_ratio": round(ratio, 4),
+        }
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict] = None,
+        json_data: Optional[Dict] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> Any:
         """
         统一的内部请求处理方法
+
+        GET 请求是幂等的，相同 URL 和参数的并发请求共享同一个进行中的任务，
+        所有调用方拿到同一个解析结果（结果对象是共享的，调用方不要修改）。
+
+        请求以发起者的优先级排队，因此交互请求不合并进行中的后台请求，
+        而是单独发起并取代它，之后到达的相同请求都合并到交互请求上，
+        避免用户查询跟着后台请求排队或被后台队列上限拒绝。
         """
-        session = await self.get_session()
         method = method.upper()
+        if method != "GET" or json_data is not None:
+            return await self._send(method, url, params, json_data, priority)
+
+        key = self._flight_key(method, url, params)
+        self._flight_stats["calls"] += 1
+
+        task = self._inflight.get(key)
+        if task is not None and priority < self._inflight_priority[key]:
+            self._flight_stats["bypassed"] += 1
+            logger.debug(f"交互请求不合并进行中的后台请求: {url}")
+            task = None
+
+        if task is None:
+            self._flight_stats["upstream"] += 1
+            task = asyncio.ensure_future(self._send(method, url, params, None, priority))
+            self._inflight[key] = task
+            self._inflight_priority[key] = priority
+            self._inflight_waiters[key] = 0
+
+            def _done(done, key=key):
+                # 已被交互请求取代时不清理新的记录
+                if self._inflight.get(key) is done:
+                    self._inflight.pop(key, None)
+                    self._inflight_priority.pop(key, None)
+                    self._inflight_waiters.pop(key, None)
+            task.add_done_callback(_done)
+        else:
+            self._flight_stats["coalesced"] += 1
+            logger.debug(f"合并进行中的请求: {url}")
+
+        self._inflight_waiters[key] += 1
+        self._flight_stats["max_waiters"] = max(self._flight_stats["max_waiters"], self._inflight_waiters[key])
+        try:
+            # shield: 某个调用方被取消时不影响其他等待者
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                self._inflight_waiters[key] -= 1
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(host, self.breaker_threshold, self.breaker_cooldown)
+            self._breakers[host] = breaker
+        return breaker
+
+    def breaker_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各主机熔断器状态和重试次数"""
+        return {host: breaker.stats() for host, breaker in self._breakers.items()}
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict] = None,
+        json_data: Optional[Dict] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        handler: Optional[Callable[[aiohttp.ClientResponse], Awaitable[Any]]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Any:
+        """
+        实际发送请求
+
+        handler 为空时按 _handle_response 解析响应，否则交给 handler 处理（如流式下载）。
+
+        GET 请求遇到网络错误、超时、5xx 或 429 时按策略退避重试，
+        每次尝试单独超时，所有尝试共享总时限。
+        """
+        if self._closing:
+            logger.warning(f"客户端正在关闭，忽略请求: {url}")
+            return None
+
+        host = urlparse(url).hostname or ""
+        breaker = self._breaker(host)
+        attempts = self.retry.retries + 1 if method == "GET" else 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.retry.deadline
+
+        session = await self.get_session()
         
         # 记录日志
         logger.debug(f"发起 {method} 请求: {url}")
         if params: logger.debug(f"Query参数: {params}")
         if json_data: logger.debug(f"Body数据: {json_data}")
 
+        for attempt in range(attempts):
+            # 熔断和限流：首次尝试直接抛给调用方，重试时放弃
+            try:
+                breaker.allow()
+            except CircuitOpenError:
+                if attempt == 0:
+                    raise
+                break
+
+            try:
+                if self.limiter:
+                    waited = await self.limiter.acquire(host, priority)
+                    if waited:
+                        logger.debug(f"请求排队 {waited * 1000:.0f}ms: {url}")
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    breaker.release()
+                    break
+                timeout = ClientTimeout(total=min(self.retry.attempt_timeout, remaining))
+                result, retryable = await self._attempt(session, method, url, params, json_data, timeout, handler, headers)
+            except APIBusyError:
+                breaker.release()
+                if attempt == 0:
+                    raise
+                break
+            except LimiterClosedError:
+                # 客户端关闭时排队中的请求，与关闭后发起的请求一样直接放弃
+                breaker.release()
+                logger.warning(f"客户端正在关闭，忽略请求: {url}")
+                return None
+            except BaseException:
+                breaker.release()
+                raise
+
+            if not retryable:
+                breaker.record_success()
+                return result
+
+            breaker.record_failure()
+            if attempt + 1 >= attempts or breaker.is_open:
+                break
+
+            delay = self.retry.backoff(attempt)
+            if loop.time() + delay >= deadline:
+                break
+            breaker.record_retry()
+            logger.info(f"{delay:.2f}s 后重试第 {attempt + 1} 次: {url}")
+            await asyncio.sleep(delay)
+
+        return None
+
+    async def _attempt(
+        self,
+        session: ClientSession,
+        method: str,
+        url: str,
+        params: Optional[Dict],
+        json_data: Optional[Dict],
+        timeout: ClientTimeout,
+        handler: Optional[Callable[[aiohttp.ClientResponse], Awaitable[Any]]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> tuple:
+        """
+        单次请求，返回 (结果, 是否可重试)
+        """
+        host = urlparse(url).hostname or ""
+        self._active[host] = self._active.get(host, 0) + 1
+        self._active_peak = max(self._active_peak, sum(self._active.values()))
+        self._idle.clear()
+        try:
+            return await self._attempt_once(session, method, url, params, json_data, timeout, handler, headers)
+        finally:
+            self._active[host] -= 1
+            if not self._active[host]:
+                del self._active[host]
+            if not self._active:
+                self._idle.set()
+
+    async def _attempt_once(
+        self,
+        session: ClientSession,
+        method: str,
+        url: str,
+        params: Optional[Dict],
+        json_data: Optional[Dict],
+        timeout: ClientTimeout,
+        handler: Optional[Callable[[aiohttp.ClientResponse], Awaitable[Any]]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> tuple:
         try:
             # aiohttp 会自动处理 json=json_data 时的 Content-Type
             async with session.request(
@@ -61,16 +374,24 @@ class APIClient:
                 url=url,
                 params=params,
                 json=json_data,
-                ssl=self.ssl_verify
+                headers=headers,
+                ssl=self.ssl_verify,
+                timeout=timeout
             ) as response:
-                return await self._handle_response(response)
+                if response.status >= 500 or response.status == 429:
+                    logger.warning(f"上游返回 {response.status} ({method} {url})")
+                    return None, True
+                return await (handler or self._handle_response)(response), False
                 
+        except asyncio.TimeoutError:
+            logger.warning(f"请求超时 ({method} {url})")
+            return None, True
         except aiohttp.ClientError as e:
             logger.error(f"网络请求出错 ({method} {url}): {e}")
-            return None
+            return None, True
         except Exception as e:
             logger.error(f"未知错误 ({method} {url}): {e}")
-            return None
+            return None, False
 
     async def _handle_response(self, response: aiohttp.ClientResponse) -> Any:
         """处理响应：自动识别二进制或JSON"""
@@ -124,16 +445,101 @@ class APIClient:
         
         return data
 
-    async def get(self, url: str, params: Optional[Dict] = None, out_key: Optional[str] = None) -> Any:
+    async def get(self, url: str, params: Optional[Dict] = None, out_key: Optional[str] = None, priority: int = PRIORITY_INTERACTIVE) -> Any:
         """GET 请求封装"""
-        data = await self._request('GET', url, params=params)
+        data = await self._request('GET', url, params=params, priority=priority)
         return self._extract_data(data, out_key)
 
-    async def post(self, url: str, data: Optional[Dict] = None, out_key: Optional[str] = None) -> Any:
+    async def post(self, url: str, data: Optional[Dict] = None, out_key: Optional[str] = None, priority: int = PRIORITY_INTERACTIVE) -> Any:
         """POST 请求封装 (默认发送 JSON)"""
-        data = await self._request('POST', url, json_data=data)
+        data = await self._request('POST', url, json_data=data, priority=priority)
         return self._extract_data(data, out_key)
 
+    async def download(
+        self,
+        url: str,
+        dest: Union[str, Path],
+        params: Optional[Dict] = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        chunk_size: int = 64 * 1024,
+        headers: Optional[Dict[str, str]] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> Optional[DownloadResult]:
+        """
+        流式下载图片到本地文件
+
+        按块写入临时文件，完成后原子替换目标文件，内存占用与图片大小无关。
+        上游返回的不是图片（如 JSON 业务报错）或超过 max_bytes 时返回 None。
+        headers 可带 If-None-Match / If-Modified-Since，上游返回 304 时 not_modified 为 True。
+        """
+        dest = Path(dest)
+
+        async def handler(response: aiohttp.ClientResponse):
+            return await self._stream_to_file(response, dest, max_bytes, chunk_size)
+
+        return await self._send("GET", url, params, None, priority, handler, headers)
+
+    async def _stream_to_file(
+        self,
+        response: aiohttp.ClientResponse,
+        dest: Path,
+        max_bytes: int,
+        chunk_size: int
+    ) -> Optional[DownloadResult]:
+        if response.status == 304:
+            return DownloadResult(
+                path=dest,
+                size=0,
+                content_type="",
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                not_modified=True,
+            )
+
+        try:
+            response.raise_for_status()
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"HTTP响应错误: {e}")
+            return None
+
+        content_type = response.headers.get('Content-Type', '').lower()
+        if 'image' not in content_type and 'octet-stream' not in content_type:
+            text = await response.text()
+            logger.error(f"下载内容不是图片 ({content_type}): {text[:100]}...")
+            return None
+
+        if response.content_length and response.content_length > max_bytes:
+            logger.error(f"图片过大 ({response.content_length} 字节)，放弃下载")
+            return None
+
+        # 并发下载同一个文件时各自写入不同的临时文件
+        tmp = dest.with_name(f"{dest.name}.{uuid.uuid4().hex}.tmp")
+        size = 0
+        # 文件操作都放到线程中，不阻塞事件循环
+        await asyncio.to_thread(dest.parent.mkdir, parents=True, exist_ok=True)
+        f = await asyncio.to_thread(open, tmp, "wb")
+        try:
+            try:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        logger.error(f"图片超过 {max_bytes} 字节，放弃下载")
+                        return None
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            await asyncio.to_thread(os.replace, tmp, dest)
+        finally:
+            await asyncio.to_thread(tmp.unlink, missing_ok=True)
+
+        return DownloadResult(
+            path=dest,
+            size=size,
+            content_type=content_type,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+
     def _extract_data(self, data: Any, key: Optional[str]) -> Any:
         """辅助方法：从结果中提取指定字段"""
         if data is None:
@@ -144,6 +550,71 @@ class APIClient:
             return data.get(key, {})
         return data
 
+    async def _page(
+        self,
+        method: str,
+        url: str,
+        params: Dict,
+        page: int,
+        out_key: str,
+        list_key: str,
+        priority: int
+    ) -> Optional[List[Any]]:
+        """获取单页数据，空页返回 None"""
+        params = {**params, "page": str(page)}
+        if method.upper() == "POST":
+            data = await self.post(url, data=params, out_key=out_key, priority=priority)
+        else:
+            data = await self.get(url, params=params, out_key=out_key, priority=priority)
+
+        if not data or isinstance(data, bytes):
+            return None
+        # 如果 data 是列表本身（有些API直接返回列表）
+        page_items = data if isinstance(data, list) else data.get(list_key)
+        return page_items or None
+
+    async def iter_pages(
+        self,
+        method: str,
+        url: str,
+        params_data: Optional[Dict] = None,
+        out_key: str = "",
+        list_key: str = "list",
+        max_pages: int = 10,
+        concurrency: int = 3,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> AsyncIterator[Any]:
+        """
+        分页获取数据，按页码顺序逐条产出
+
+        最多同时请求 concurrency 页，前面的页处理完再补充后面的页，
+        内存中只保留窗口内的页面。遇到第一个空页即停止，并取消窗口内剩余的请求。
+        """
+        params = params_data.copy() if params_data else {}
+        window: Deque[asyncio.Task] = deque()
+        next_page = 1
+
+        try:
+            while True:
+                while len(window) < max(1, concurrency) and next_page <= max_pages:
+                    window.append(asyncio.create_task(
+                        self._page(method, url, params, next_page, out_key, list_key, priority)
+                    ))
+                    next_page += 1
+                if not window:
+                    break
+
+                page_items = await window.popleft()
+                if not page_items:
+                    break
+                for item in page_items:
+                    yield item
+        finally:
+            for task in window:
+                task.cancel()
+            if window:
+                await asyncio.gather(*window, return_exceptions=True)
+
     async def all_pages(
         self, 
         method: str, 
@@ -151,41 +622,20 @@ class APIClient:
         params_data: Optional[Dict] = None, 
         out_key: str = "", 
         list_key: str = "list", 
-        max_pages: int = 10
+        max_pages: int = 10,
+        concurrency: int = 3,
+        priority: int = PRIORITY_INTERACTIVE
     ) -> List[Any]:
         """
         分页获取所有数据
         :param method: GET 或 POST
         :param list_key: 列表数据在 JSON 中的字段名，如 'data' 或 'list'
+        :param concurrency: 同时请求的页数，1 为逐页请求
         """
-        all_data = []
-        current_page = 1
-        params = params_data.copy() if params_data else {}
-
-        while True:
-            params["page"] = str(current_page)
-            
-            if method.upper() == "POST":
-                data = await self.post(url, data=params, out_key=out_key)
-            else:
-                data = await self.get(url, params=params, out_key=out_key)
-
-            # 终止条件判断
-            if not data or isinstance(data, bytes):
-                break
-            
-            # 如果 data 是列表本身（有些API直接返回列表）
-            page_items = data if isinstance(data, list) else data.get(list_key)
-            
-            if not page_items:
-                break
-
-            all_data.extend(page_items)
-
-            if current_page >= max_pages:
-                break
-
-            current_page += 1
-            logger.info(f"已获取第 {current_page} 页数据")
-
-        return all_data
\ No newline at end of file
+        all_data = [
+            item async for item in self.iter_pages(
+                method, url, params_data, out_key, list_key, max_pages, concurrency, priority
+            )
+        ]
+        logger.info(f"分页获取完成，共 {len(all_data)} 条数据")
+        return all_data
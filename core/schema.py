@@ -0,0 +1,138 @@
+# pyright: reportOptionalMemberAccess=false
+
+from astrbot.api import logger
+
+from .sqlite import AsyncSQLiteDB
+
+
+# 当前数据库结构版本，记录在 PRAGMA user_version 中
+SCHEMA_VERSION = 5
+
+
+async def _table_exists(db: AsyncSQLiteDB, table: str) -> bool:
+    row = await db.fetch_one(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+        (table,)
+    )
+    return row is not None
+
+
+async def _migrate_v1(db: AsyncSQLiteDB):
+    """
+    v1：users 表以 gokid 为主键，name 建索引。
+
+    旧表没有任何约束，迁移时按 gokid 去重（保留最后写入的一行），
+    无法转换为整数的 gokid 直接丢弃。
+    """
+    if not await _table_exists(db, "users"):
+        await db.executescript("""
+        CREATE TABLE users(
+            gokid INTEGER PRIMARY KEY,
+            name TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_name ON users(name);
+        """)
+        return
+
+    before = await db.fetch_one("SELECT COUNT(*) AS n FROM users")
+    await db.executescript("""
+    BEGIN;
+    CREATE TABLE users_new(
+        gokid INTEGER PRIMARY KEY,
+        name TEXT NOT NULL
+    );
+    INSERT INTO users_new (gokid, name)
+        SELECT CAST(gokid AS INTEGER), COALESCE(name, '') FROM users
+        WHERE rowid IN (
+            SELECT MAX(rowid) FROM users
+            WHERE gokid IS NOT NULL AND CAST(gokid AS INTEGER) = gokid
+            GROUP BY CAST(gokid AS INTEGER)
+        );
+    DROP TABLE users;
+    ALTER TABLE users_new RENAME TO users;
+    CREATE INDEX IF NOT EXISTS idx_users_name ON users(name);
+    COMMIT;
+    """)
+    after = await db.fetch_one("SELECT COUNT(*) AS n FROM users")
+    logger.info(f"users 表已升级，原有 {before['n']} 行，去重后 {after['n']} 行")
+
+
+async def _migrate_v2(db: AsyncSQLiteDB):
+    """v2：新增 matches 表，保存拉取过的全部对局"""
+    await db.executescript("""
+    CREATE TABLE IF NOT EXISTS matches(
+        gokid INTEGER NOT NULL,
+        option TEXT NOT NULL,
+        gametime TEXT NOT NULL,
+        data TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (gokid, option, gametime)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_matches_fetched ON matches(fetched_at);
+    """)
+
+
+async def _migrate_v3(db: AsyncSQLiteDB):
+    """v3：新增 image_cache 表，记录本地资料图片的缓存信息"""
+    await db.executescript("""
+    CREATE TABLE IF NOT EXISTS image_cache(
+        gokid INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        fetched_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    """)
+
+
+async def _migrate_v4(db: AsyncSQLiteDB):
+    """v4：新增 hero_power 表，保存英雄最低上榜战力快照"""
+    await db.executescript("""
+    CREATE TABLE IF NOT EXISTS hero_power(
+        hero TEXT NOT NULL,
+        type TEXT NOT NULL,
+        province TEXT,
+        province_power INTEGER,
+        city TEXT,
+        city_power INTEGER,
+        area TEXT,
+        area_power INTEGER,
+        updatetime TEXT,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (hero, type)
+    ) WITHOUT ROWID;
+    """)
+
+
+async def _migrate_v5(db: AsyncSQLiteDB):
+    """v5：新增 comment_cache 表，按对局摘要缓存战绩锐评"""
+    await db.executescript("""
+    CREATE TABLE IF NOT EXISTS comment_cache(
+        digest TEXT PRIMARY KEY,
+        comment TEXT NOT NULL,
+        created_at REAL NOT NULL
+    ) WITHOUT ROWID;
+    """)
+
+
+MIGRATIONS = {
+    1: _migrate_v1,
+    2: _migrate_v2,
+    3: _migrate_v3,
+    4: _migrate_v4,
+    5: _migrate_v5,
+}
+
+
+async def migrate(db: AsyncSQLiteDB):
+    """按 user_version 依次执行未完成的迁移"""
+    row = await db.fetch_one("PRAGMA user_version")
+    version = row["user_version"] if row else 0
+
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        logger.info(f"数据库结构升级: v{target - 1} -> v{target}")
+        await MIGRATIONS[target](db)
+        # PRAGMA 不支持参数绑定
+        await db.execute(f"PRAGMA user_version={int(target)}")
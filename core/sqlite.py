@@ -1,13 +1,29 @@
 # pyright: reportOptionalMemberAccess=false
 
+import asyncio
 import aiosqlite
-from typing import Any, Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# 连接参数：WAL 日志模式下读写互不阻塞，NORMAL 同步级别在 WAL 下不会损坏数据库
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA mmap_size=67108864",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
 
 
 class AsyncSQLiteDB:
     def __init__(self, db_path: str = "data.db"):
         self.db_path = db_path
         self.conn: Optional[aiosqlite.Connection] = None
+        # 事务锁：事务进行中，其他任务的读写等待事务结束
+        self._tx_lock = asyncio.Lock()
+        self._tx_owner: Optional[asyncio.Task] = None
 
     # ======================
     # 生命周期
@@ -16,6 +32,8 @@ class AsyncSQLiteDB:
     async def connect(self):
         self.conn = await aiosqlite.connect(self.db_path)
         self.conn.row_factory = aiosqlite.Row
+        for pragma in PRAGMAS:
+            await self.conn.execute(pragma)
 
     async def close(self):
         if self.conn:
@@ -25,16 +43,76 @@ class AsyncSQLiteDB:
     # 基础执行
     # ======================
 
+    def _in_transaction(self) -> bool:
+        return self._tx_owner is not None and self._tx_owner is asyncio.current_task()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        事务上下文，块内的写入在退出时统一提交，出错时回滚。
+
+        只对当前任务生效，块内不要再创建子任务写入数据库。嵌套调用并入外层事务。
+        """
+        if self._in_transaction():
+            yield self
+            return
+
+        async with self._tx_lock:
+            self._tx_owner = asyncio.current_task()
+            try:
+                if self.conn.in_transaction:
+                    await self.conn.commit()
+                await self.conn.execute("BEGIN")
+                try:
+                    yield self
+                except BaseException:
+                    await self.conn.rollback()
+                    raise
+                await self.conn.commit()
+            finally:
+                self._tx_owner = None
+
     async def execute(self, sql: str, params: Tuple = ()):
-        async with self.conn.execute(sql, params):
+        if self._in_transaction():
+            async with self.conn.execute(sql, params):
+                return
+        async with self._tx_lock:
+            async with self.conn.execute(sql, params):
+                await self.conn.commit()
+
+    async def executemany(self, sql: str, seq_of_params: Iterable[Sequence[Any]]):
+        if self._in_transaction():
+            await self.conn.executemany(sql, seq_of_params)
+            return
+        async with self._tx_lock:
+            await self.conn.executemany(sql, seq_of_params)
+            await self.conn.commit()
+
+    async def executescript(self, script: str):
+        """执行多条语句（会先提交当前事务）"""
+        async with self._tx_lock:
+            await self.conn.executescript(script)
             await self.conn.commit()
 
+    async def _wait_transaction(self):
+        """
+        其他任务的事务或写入进行中时等待其结束，避免在共享连接上读到未提交的数据。
+
+        只等待锁释放而不持有锁，读取之间互不阻塞；释放后到发出查询之间没有让出事件循环，
+        查询一定排在下一次写入之前。
+        """
+        if self._tx_lock.locked() and not self._in_transaction():
+            async with self._tx_lock:
+                pass
+
     async def fetch_one(self, sql: str, params: Tuple = ()) -> Optional[Dict[str, Any]]:
+        await self._wait_transaction()
         async with self.conn.execute(sql, params) as cursor:
             row = await cursor.fetchone()
             return dict(row) if row else None
 
     async def fetch_all(self, sql: str, params: Tuple = ()) -> List[Dict[str, Any]]:
+        await self._wait_transaction()
         async with self.conn.execute(sql, params) as cursor:
             rows = await cursor.fetchall()
             return [dict(r) for r in rows]
@@ -49,6 +127,29 @@ class AsyncSQLiteDB:
         sql = f"INSERT INTO {table} ({keys}) VALUES ({placeholders})"
         await self.execute(sql, tuple(data.values()))
 
+    async def insert_many(self, table: str, rows: List[Dict[str, Any]]):
+        """批量插入，所有行的字段需一致"""
+        if not rows:
+            return
+        keys = list(rows[0].keys())
+        placeholders = ", ".join(["?"] * len(keys))
+        sql = f"INSERT INTO {table} ({', '.join(keys)}) VALUES ({placeholders})"
+        await self.executemany(sql, [tuple(r[k] for k in keys) for r in rows])
+
+    async def upsert_many(self, table: str, rows: List[Dict[str, Any]], conflict: str):
+        """批量插入或更新，conflict 为唯一约束字段（多个用逗号分隔），冲突时更新其余字段"""
+        if not rows:
+            return
+        keys = list(rows[0].keys())
+        conflict_keys = {k.strip() for k in conflict.split(",")}
+        placeholders = ", ".join(["?"] * len(keys))
+        updates = ", ".join(f"{k}=excluded.{k}" for k in keys if k not in conflict_keys)
+        sql = (
+            f"INSERT INTO {table} ({', '.join(keys)}) VALUES ({placeholders}) "
+            f"ON CONFLICT({conflict}) DO UPDATE SET {updates}"
+        )
+        await self.executemany(sql, [tuple(r[k] for k in keys) for r in rows])
+
     async def update(self, table: str, data: Dict[str, Any], where: str, params: Tuple):
         set_clause = ", ".join([f"{k}=?" for k in data.keys()])
         sql = f"UPDATE {table} SET {set_clause} WHERE {where}"
@@ -0,0 +1,127 @@
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from astrbot.api import logger
+
+from .sqlite import AsyncSQLiteDB
+
+
+def normalize_name(name: str) -> str:
+    """
+    名称规范化：全角转半角（NFKC）、去除空白、忽略大小写
+    """
+    return "".join(unicodedata.normalize("NFKC", str(name)).split()).casefold()
+
+
+class UserIndex:
+    """
+    角色名称 -> 王者营地ID 的内存索引
+
+    启动时从 users 表加载，增删改时同步写入，查询不再访问数据库。
+    通过 PRAGMA data_version 检测其他进程对数据库的修改，发现变化后整体重载。
+    """
+
+    def __init__(self, sqlite: AsyncSQLiteDB, check_interval: float = 5.0):
+        self._sql_db = sqlite
+        self.check_interval = check_interval
+        self._by_gokid: Dict[int, str] = {}
+        self._by_name: Dict[str, Set[int]] = {}
+        self._by_norm: Dict[str, Set[int]] = {}
+        self._data_version: Optional[int] = None
+        self._checked_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._by_gokid)
+
+    async def load(self):
+        """从数据库全量加载"""
+        rows = await self._sql_db.fetch_all("SELECT gokid, name FROM users")
+        self._by_gokid.clear()
+        self._by_name.clear()
+        self._by_norm.clear()
+        for row in rows:
+            self._put(row["gokid"], row["name"])
+
+        self._data_version = await self._fetch_data_version()
+        self._checked_at = time.monotonic()
+        logger.info(f"角色索引已加载 {len(self._by_gokid)} 条数据")
+
+    async def _fetch_data_version(self) -> Optional[int]:
+        row = await self._sql_db.fetch_one("PRAGMA data_version")
+        return row["data_version"] if row else None
+
+    async def _check_stale(self):
+        """按间隔检查数据库是否被其他连接修改"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        version = await self._fetch_data_version()
+        if version != self._data_version:
+            logger.info("检测到角色数据被外部修改，重新加载角色索引")
+            await self.load()
+
+    # ======================
+    # 查询
+    # ======================
+
+    async def items(self) -> List[Tuple[int, str]]:
+        """全部角色 (营地ID, 名称)，按ID排序"""
+        await self._check_stale()
+        return sorted(self._by_gokid.items())
+
+    async def resolve(self, name: str) -> Optional[int]:
+        """
+        名称解析为营地ID：先精确匹配，再按规范化名称匹配。
+        同名时返回最小的ID，与按主键顺序查询数据库的结果一致。
+        """
+        await self._check_stale()
+
+        ids = self._by_name.get(name)
+        if not ids:
+            ids = self._by_norm.get(normalize_name(name))
+        if not ids:
+            return None
+        return min(ids)
+
+    async def resolve_many(self, names: List[str]) -> Dict[str, Optional[int]]:
+        """批量解析，只做一次数据库变更检查"""
+        await self._check_stale()
+
+        result: Dict[str, Optional[int]] = {}
+        for name in names:
+            ids = self._by_name.get(name) or self._by_norm.get(normalize_name(name))
+            result[name] = min(ids) if ids else None
+        return result
+
+    # ======================
+    # 写入同步
+    # ======================
+
+    def _put(self, gokid: int, name: str):
+        self._by_gokid[gokid] = name
+        self._by_name.setdefault(name, set()).add(gokid)
+        self._by_norm.setdefault(normalize_name(name), set()).add(gokid)
+
+    def _remove(self, gokid: int):
+        name = self._by_gokid.pop(gokid, None)
+        if name is None:
+            return
+        for index, key in ((self._by_name, name), (self._by_norm, normalize_name(name))):
+            ids = index.get(key)
+            if ids:
+                ids.discard(gokid)
+                if not ids:
+                    del index[key]
+
+    def on_add(self, gokid: int, name: str):
+        self._remove(gokid)
+        self._put(gokid, name)
+
+    def on_update(self, gokid: int, name: str):
+        self.on_add(gokid, name)
+
+    def on_delete(self, gokid: int):
+        self._remove(gokid)
@@ -3,7 +3,10 @@
 # pyright: reportArgumentType=false
 
 import json
-import inspect
+import time
+import logging
+import asyncio
+from datetime import datetime
 from pathlib import Path
 
 
@@ -11,9 +14,17 @@ from astrbot.api.event import filter, AstrMessageEvent, MessageEventResult, Mess
 from astrbot.api.star import Context, Star, register, StarTools
 from astrbot.api import logger
 from astrbot.api import AstrBotConfig
+import astrbot.api.message_components as Comp
 
 from .core.sqlite import AsyncSQLiteDB
+from .core.schema import migrate
 from .core.gok_data import GOKServer
+from .core.render_cache import RenderCache
+from .core.dispatcher import CommandDispatcher
+from .core.metrics import metrics
+from .core.local_render import LocalRenderer, BackendSelector, BACKEND_HTML, BACKEND_LOCAL
+from .core.fun_basic import templates
+from .core.comment import CommentCache, build_prompt, legacy_prompt, estimate_tokens, digest
 
 
 @register("astrbot_plugin_gok", 
@@ -40,9 +51,6 @@ class GokApiPlugin(Star):
         with open(self.api_file_path, 'r', encoding='utf-8') as f:
             self.api_config = json.load(f)  
 
-        # 声明指令集
-        self.command_map = {}
-
         # 指令前缀功能
         self.prefix_en = self.conf.get("prefix").get("enable")
         self.prefix_text = self.conf.get("prefix").get("text")
@@ -53,14 +61,51 @@ class GokApiPlugin(Star):
         else:
             logger.info(f"未启用指令前缀功能。")
 
+        # 声明指令集
+        self.dispatcher = CommandDispatcher(self.prefix_text, self.prefix_en)
+
         # 战绩锐评功能
         self.comment_en = self.conf.get("comment").get("enable")
         self.comment_provider = self.conf.get("comment").get("select_provider")
+        # image_first: 先发图片再发锐评；first_done: 谁先完成先发谁
+        self.comment_order = self.conf.get("comment").get("order", "image_first")
+        # 锐评缓存有效期，0 表示不缓存
+        self.comment_cache_hours = float(self.conf.get("comment").get("cache_hours", 72))
+        self.comment_cache = None
         if self.comment_en:
             logger.info(f"锐评功能已经启用，模型为：{self.comment_provider}")
         else:
             logger.info(f"未启用锐评功能")
 
+        # 文转图结果缓存
+        render_conf = self.conf.get("render_cache") or {}
+        self.render_cache_en = render_conf.get("enable", True)
+        self.render_cache = RenderCache(
+            max_entries=render_conf.get("max_entries", 128),
+            ttl=render_conf.get("ttl", 3600)
+        )
+        self._prerender_task = None
+
+        # 渲染后端：auto 按各模板实测耗时选择，html 只用文转图服务，local 优先本地渲染
+        backend_conf = self.conf.get("render") or {}
+        self.render_selector = BackendSelector(backend_conf.get("backend", "auto"))
+        self.local_render = None
+        if self.render_selector.mode != BACKEND_HTML:
+            self.local_render = LocalRenderer.create(
+                Path(self.local_data_dir) / "render",
+                font=backend_conf.get("font", ""),
+                bold_font=backend_conf.get("bold_font", ""),
+                workers=backend_conf.get("workers", 2)
+            )
+
+        # 性能统计
+        metrics_conf = self.conf.get("metrics") or {}
+        metrics.configure(metrics_conf.get("enable", False))
+        self.metrics_file = None
+        if metrics.enabled and metrics_conf.get("prometheus", False):
+            self.metrics_file = Path(self.local_data_dir) / "metrics.prom"
+        self.metrics_interval = metrics_conf.get("interval", 60)
+
         logger.info("GOK 插件初始化完成")
 
 
@@ -70,14 +115,14 @@ class GokApiPlugin(Star):
             # sqlite 实例化
             self.sql_db = AsyncSQLiteDB(self.sqlite_path)
             await self.sql_db.connect()
-            await self.sql_db.execute("""
-            CREATE TABLE IF NOT EXISTS users(
-                gokid INTEGER,
-                name TEXT                          
-            )
-            """)
+            await migrate(self.sql_db)
             # 王者功能 实例化
-            self.gokfun = GOKServer(self.api_config, self.conf, self.sql_db)
+            self.gokfun = GOKServer(self.api_config, self.conf, self.sql_db, self.local_data_dir)
+            await self.gokfun.initialize()
+            # 锐评缓存
+            if self.comment_en and self.comment_cache_hours > 0:
+                self.comment_cache = CommentCache(self.sql_db, ttl=self.comment_cache_hours * 3600)
+                await self.comment_cache.prune()
 
         except Exception as e:
             logger.error(f"功能模块初始化失败: {e}")
@@ -86,11 +131,35 @@ class GokApiPlugin(Star):
         # 指令集
         self.ini_command_map()
 
+        if self.local_render:
+            try:
+                await self.local_render.start()
+            except Exception as e:
+                logger.error(f"本地渲染启动失败，改用文转图服务: {e}")
+                self.local_render = None
+
+        # 预渲染静态页面
+        if self.render_cache_en:
+            self._prerender_task = asyncio.create_task(self.prerender_static())
+
+        if self.metrics_file:
+            metrics.start_export(self.metrics_file, self.metrics_interval)
+
         logger.info("GOK 异步插件初始化完成")
 
 
     async def terminate(self):
         """可选择实现异步的插件销毁方法，当插件被卸载/停用时会调用。"""
+        if self._prerender_task and not self._prerender_task.done():
+            self._prerender_task.cancel()
+        logger.info(f"文转图缓存统计: {self.render_cache.stats()}")
+        logger.info(f"渲染后端耗时统计: {self.render_selector.stats()}")
+        if self.local_render:
+            await self.local_render.close()
+        await metrics.stop_export(self.metrics_file)
+        if self.comment_cache:
+            logger.info(f"锐评缓存统计: {self.comment_cache.stats()}")
+
         if self.gokfun:
             await self.gokfun.close()
             self.gokfun = None
@@ -102,82 +171,22 @@ class GokApiPlugin(Star):
         logger.info("GOK 插件已卸载/停用")
 
 
-    def parse_message(self, text: str) -> list[str] | None:
-        """消息解析"""
-        text = text.strip()
-        if not text:
-            return None
-
-        # 前缀模式
-        if self.prefix_en:
-            prefix = self.prefix_text
-            if text.startswith(prefix):
-                text = text[len(prefix):].strip()
-            else:
-                # 非前缀消息，直接忽略
-                return None
-
-        return text.split()
-
-
-    async def _call_with_auto_args(self, handler, event: AstrMessageEvent, args: list[str]):
-        """指令执行函数"""
-        sig = inspect.signature(handler)
-        params = list(sig.parameters.values())
-
-        call_args = []
-        arg_index = 0
-
-        for p in params:
-            if p.name == "self":
-                continue
-
-            if p.name == "event":
-                call_args.append(event)
-                continue
-
-            if arg_index < len(args):
-                raw = args[arg_index]
-                arg_index += 1
-                try:
-                    if p.annotation is int:
-                        call_args.append(int(raw))
-                    elif p.annotation is float:
-                        call_args.append(float(raw))
-                    else:
-                        call_args.append(raw)
-                except Exception:
-                    call_args.append(p.default)
-            else:
-                if p.default is not inspect._empty:
-                    call_args.append(p.default)
-                else:
-                    raise ValueError(f"缺少参数: {p.name}")
-
-        # 只允许 coroutine
-        return await handler(*call_args)
-    
-
     @filter.event_message_type(filter.EventMessageType.ALL)
     async def on_all_message(self, event: AstrMessageEvent):
         """解析所有消息"""
-        if not self.command_map:
+        if not self.dispatcher:
             logger.debug("插件尚未初始化完成，忽略消息")
             return
-        parts = self.parse_message(event.message_str)
-        if not parts:
-            logger.debug("未触发指令，忽略消息")
-            return
 
-        cmd, *args = parts
-        handler = self.command_map.get(cmd)
-        if not handler:
-            logger.debug("指令函数为空，忽略消息")
+        matched = self.dispatcher.match(event.message_str)
+        if not matched:
             return
 
+        cmd, handler, args = matched
         try:
             event.stop_event()
-            ret = await self._call_with_auto_args(handler, event, args)
+            with metrics.command(cmd):
+                ret = await handler(event, args)
             if ret is not None:
                 yield ret
         except Exception as e:
@@ -187,17 +196,125 @@ class GokApiPlugin(Star):
 
     def ini_command_map(self):
         """初始化指令集"""
-        self.command_map = {
+        commands = {
             "功能": self.gok_helps,
             "战绩": self.gok_zhanji,
             "资料": self.gok_ziliao,
             "上榜战力": self.gok_zhanli,
+            "战力排行": self.gok_zhanli_rank,
+            "排行榜": self.gok_leaderboard,
             "角色查看": self.gok_user_all,
             "角色添加": self.gok_user_add,
             "角色修改": self.gok_user_update,
             "角色删除": self.gok_user_delete,
-            "角色查询": self.gok_user_select
+            "角色查询": self.gok_user_select,
+            "角色导入": self.gok_user_import,
+            "性能统计": self.gok_metrics
         }
+        for name, handler in commands.items():
+            self.dispatcher.register(name, handler)
+
+        # 自定义指令别名，格式：别名=指令
+        for item in self.conf.get("alias") or []:
+            alias, _, name = str(item).partition("=")
+            if self.dispatcher.add_alias(alias.strip(), name.strip()):
+                logger.info(f"已添加指令别名：{alias.strip()} -> {name.strip()}")
+            else:
+                logger.warning(f"指令别名配置无效：{item}")
+
+
+    async def send_result(self, event: AstrMessageEvent, result):
+        """发送消息，计入 send 阶段耗时"""
+        with metrics.span("send"):
+            await event.send(result)
+
+
+    @metrics.timed("render")
+    async def render(self, data, options: dict | None = None) -> str:
+        """文转图渲染，相同的模板和数据直接返回缓存的图片"""
+        options = options or {}
+        if not self.render_cache_en:
+            return await self.render_backend(data, options)
+
+        key = RenderCache.make_key(data["temp"], data["data"], options)
+        url = self.render_cache.get(key)
+        # 本地渲染的文件可能已被清理
+        if url and (url.startswith("http") or Path(url).exists()):
+            return url
+
+        url = await self.render_backend(data, options)
+        if url:
+            self.render_cache.set(key, url, tag=data.get("render_tag"))
+        return url
+
+
+    async def render_backend(self, data, options: dict) -> str:
+        """按模板选择文转图服务或本地渲染，记录耗时供后续选择"""
+        template = templates.name_of(data["temp"])
+        backend = BACKEND_HTML
+        if self.local_render and self.local_render.supports(template) and not options:
+            backend = self.render_selector.choose(template, (BACKEND_HTML, BACKEND_LOCAL))
+
+        if backend == BACKEND_LOCAL:
+            missing = self.local_render.missing_icons(template, data["data"])
+            if missing:
+                self.gokfun.download_icons(missing, self.local_render.icon_dir)
+
+            start = time.perf_counter()
+            try:
+                with metrics.span("render_local"):
+                    url = await self.local_render.render(template, data["data"])
+                self.render_selector.observe(template, BACKEND_LOCAL, time.perf_counter() - start)
+                return url
+            except Exception as e:
+                logger.warning(f"本地渲染失败，改用文转图服务 ({template}): {e}")
+                self.render_selector.failed(template, BACKEND_LOCAL)
+
+        start = time.perf_counter()
+        with metrics.span("render_html"):
+            url = await self.html_render(data["temp"], data["data"], options=options)
+        if template:
+            self.render_selector.observe(template, BACKEND_HTML, time.perf_counter() - start)
+        return url
+
+
+    async def prerender_static(self):
+        """启动时预渲染静态页面（功能帮助）"""
+        try:
+            data = await self.gokfun.helps()
+            if data["code"] == 200:
+                await self.render(data)
+                logger.info("功能帮助图片预渲染完成")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"预渲染静态页面失败: {e}")
+
+
+    async def read_attachments(self, event: AstrMessageEvent, max_bytes: int = 1024 * 1024) -> list[str]:
+        """读取消息中附带的文本文件（CSV/JSON）"""
+        contents = []
+        for comp in event.get_messages():
+            if not isinstance(comp, Comp.File):
+                continue
+            try:
+                path = Path(await comp.get_file())
+                if path.stat().st_size > max_bytes:
+                    logger.warning(f"附件过大，已忽略: {path}")
+                    continue
+                contents.append(await asyncio.to_thread(path.read_text, encoding="utf-8-sig"))
+            except Exception as e:
+                logger.error(f"读取附件失败: {e}")
+        return contents
+
+
+    async def send_as_of(self, event: AstrMessageEvent, data):
+        """上游不可用或本地快照过期时返回的是旧数据，补充说明数据时间"""
+        if not data.get("as_of"):
+            return
+        as_of = datetime.fromtimestamp(data["as_of"]).strftime("%m-%d %H:%M")
+        reason = data.get("as_of_reason") or "接口暂时不可用"
+        await self.send_result(event, event.plain_result(f"{reason}，以上为 {as_of} 的缓存数据"))
 
 
     async def plain_msg(self, event: AstrMessageEvent, action):
@@ -205,12 +322,13 @@ class GokApiPlugin(Star):
         data= await action()
         try:
             if data["code"] == 200:
-                await event.send( event.plain_result(data["data"]))
+                await self.send_result(event, event.plain_result(data["data"]))
+                await self.send_as_of(event, data)
             else:
-                await event.send(event.plain_result(data["msg"])) 
+                await self.send_result(event, event.plain_result(data["msg"])) 
         except Exception as e:
             logger.error(f"功能函数执行错误: {e}")
-            await event.send(event.plain_result("猪脑过载，请稍后再试")) 
+            await self.send_result(event, event.plain_result("猪脑过载，请稍后再试")) 
 
 
     async def T2I_image_msg(self, event: AstrMessageEvent, action):
@@ -218,14 +336,15 @@ class GokApiPlugin(Star):
         data = await action()
         try:
             if data["code"] == 200:
-                url = await self.html_render(data["temp"], data["data"], options={})
-                await event.send(event.image_result(url)) 
+                url = await self.render(data)
+                await self.send_result(event, event.image_result(url)) 
+                await self.send_as_of(event, data)
             else:
-                await event.send(event.plain_result(data["msg"])) 
+                await self.send_result(event, event.plain_result(data["msg"])) 
 
         except Exception as e:
             logger.error(f"功能函数执行错误: {e}")
-            await event.send(event.plain_result("猪脑过载，请稍后再试")) 
+            await self.send_result(event, event.plain_result("猪脑过载，请稍后再试")) 
 
 
     async def image_msg(self, event: AstrMessageEvent, action):
@@ -233,94 +352,235 @@ class GokApiPlugin(Star):
         data = await action()
         try:
             if data["code"] == 200:
-                await event.send(event.image_result(data["data"])) 
+                await self.send_result(event, event.image_result(data["data"])) 
+                await self.send_as_of(event, data)
             else:
-                await event.send(event.plain_result(data["msg"])) 
+                await self.send_result(event, event.plain_result(data["msg"])) 
 
         except Exception as e:
             logger.error(f"功能函数执行错误: {e}")
-            await event.send(event.plain_result("猪脑过载，请稍后再试")) 
+            await self.send_result(event, event.plain_result("猪脑过载，请稍后再试")) 
 
 
     async def T2I_image_and_plain_msg(self, event: AstrMessageEvent, action):
-        """战绩定制功能"""
+        """战绩定制功能：渲染图片和锐评同时进行，各自完成后发送"""
         data = await action()
 
-        # 发送渲染战绩图片
-        try:
-            if data["code"] == 200:
-                url = await self.html_render(data["temp"], data["data"], options={})
-                await event.send(event.image_result(url)) 
-            else:
-                await event.send(event.plain_result(data["msg"])) 
+        if data["code"] != 200:
+            await self.send_result(event, event.plain_result(data["msg"])) 
+            return
 
-        except Exception as e:
-            logger.error(f"功能函数执行错误: {e}")
-            await event.send(event.plain_result("猪脑过载，请稍后再试")) 
+        start = time.perf_counter()
+        timings = {}
+        image_sent = asyncio.Event()
+
+        # 发送渲染战绩图片
+        async def image_branch():
+            t0 = time.perf_counter()
+            try:
+                url = await self.render(data)
+                timings["render"] = time.perf_counter() - t0
+                await self.send_result(event, event.image_result(url)) 
+                await self.send_as_of(event, data)
+            finally:
+                timings["image"] = time.perf_counter() - t0
+                image_sent.set()
 
         # 对战绩进行锐评
+        async def comment_branch():
+            t0 = time.perf_counter()
+            text = await self.comment(event, data)
+            timings["llm"] = time.perf_counter() - t0
+            if self.comment_order == "image_first":
+                await image_sent.wait()
+            await self.send_result(event, event.plain_result(text)) 
+            timings["comment"] = time.perf_counter() - t0
+
+        image_task = asyncio.create_task(image_branch())
+        comment_task = asyncio.create_task(comment_branch()) if self.comment_en else None
+
         try:
-            if data["code"] == 200 and self.comment_en:
-                # 确定使用模型
-                if self.comment_provider == "":
-                    umo = event.unified_msg_origin
-                    provider_id = await self.context.get_current_chat_provider_id(umo=umo)
-                else:
-                    provider_id = self.comment_provider
-
-                # 模型提示词构建
-                prompt = "请根据下面提供的王者荣耀最近10把的战绩数据，用简短的一句话进行锐评吐槽。"
-                prompt += f"这是战绩列表\n{data['comment']['data']}\n"
-                prompt += f"gametime 字段 对局开始时间\n"
-                prompt += f"killcnt 字段 击杀数\n"
-                prompt += f"deadcnt 字段 死亡数\n"
-                prompt += f"assistcnt 字段 助攻数\n"
-                prompt += f"gameresult 字段 1代表胜利 2代表失败 3代表平局\n"
-                prompt += f"mvpcnt 字段 1代表是胜利方MVP 0表示不是\n"
-                prompt += f"losemvp 字段 1代表是失败方MVP 0表示不是\n"
-                prompt += f"gradeGame 字段 系统给的评分，满分16分\n"
-
-                # 调用模型
+            try:
+                await image_task
+            except Exception as e:
+                logger.error(f"功能函数执行错误: {e}")
+                # 图片失败时锐评没有意义，直接取消
+                if comment_task:
+                    comment_task.cancel()
+                await self.send_result(event, event.plain_result("猪脑过载，请稍后再试")) 
+
+            if comment_task:
+                [result] = await asyncio.gather(comment_task, return_exceptions=True)
+                if isinstance(result, Exception):
+                    logger.error(f"功能函数执行错误: {result}")
+                    await self.send_result(event, event.plain_result("猪脑过载，请稍后再试")) 
+        finally:
+            if comment_task and not comment_task.done():
+                comment_task.cancel()
+
+        cost = " ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items())
+        logger.info(f"战绩流水线耗时: {cost} total={(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+    async def comment(self, event: AstrMessageEvent, data) -> str:
+        """调用模型对战绩进行锐评"""
+        # 确定使用模型
+        if self.comment_provider == "":
+            umo = event.unified_msg_origin
+            provider_id = await self.context.get_current_chat_provider_id(umo=umo)
+        else:
+            provider_id = self.comment_provider
+
+        # 模型提示词构建：对局压缩为表格，表头只出现一次
+        rows = data["comment"]["data"]
+        prompt = build_prompt(rows)
+
+        async def generate() -> str:
+            logger.info(f"锐评提示词约 {estimate_tokens(prompt)} tokens")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"锐评提示词旧格式约 {estimate_tokens(legacy_prompt(rows))} tokens")
+            with metrics.span("llm"):
                 llm_resp = await self.context.llm_generate(chat_provider_id=provider_id, prompt=prompt)
-                # 发送消息
-                await event.send(event.plain_result(llm_resp.completion_text)) 
+            return llm_resp.completion_text
 
-        except Exception as e:
-            logger.error(f"功能函数执行错误: {e}")
-            await event.send(event.plain_result("猪脑过载，请稍后再试")) 
+        # 没有新对局时复用上一次的锐评
+        if self.comment_cache:
+            return await self.comment_cache.fetch(digest(provider_id, rows), generate)
+        return await generate()
 
 
     async def gok_helps(self, event: AstrMessageEvent):
         """王者功能"""
         return await self.T2I_image_msg(event, self.gokfun.helps)
     
-    async def gok_zhanji(self, event: AstrMessageEvent,name: str,option:str = 0):
-        """王者战绩"""
-        return await self.T2I_image_and_plain_msg(event, lambda: self.gokfun.zhanji(name ,option))
+    async def gok_zhanji(self, event: AstrMessageEvent, *items: str):
+        """王者战绩 角色/营地ID（可以多个） 模式=数字"""
+        names = []
+        option = "0"
+        # 模式必须写成 模式=数字，其余参数都是角色或营地ID，避免纯数字的名称被误当成模式
+        for item in items:
+            if item.startswith("模式="):
+                option = item[3:]
+                if not option.isdigit():
+                    raise ValueError(f"模式参数错误: {item}，例如 模式=1")
+            else:
+                names.append(item)
+        if not names:
+            raise ValueError("缺少参数: name")
+
+        if len(names) > 1:
+            gokids = await self.gokfun.get_gokids(names)
+            found = [name for name in names if gokids.get(name)]
+            last = names[-1]
+            # 旧写法 "战绩 角色 模式"：末尾的短数字不是角色时提示改用 模式=
+            if last not in found and last.isdigit() and len(last) <= 2 and option == "0":
+                await self.send_result(event, event.plain_result(
+                    f"“{last}”不是已登记的角色或营地ID。如果要指定查询模式，请写成 模式={last}，"
+                    f"例如：战绩 {' '.join(names[:-1])} 模式={last}"
+                ))
+                return
+            # 只有一个角色能查到时按单人战绩处理，不生成对比图
+            if len(found) == 1:
+                missing = [name for name in names if name not in found]
+                await self.send_result(event, event.plain_result(f"未查询到：{'、'.join(missing)}"))
+                names = found
+
+        if len(names) == 1:
+            return await self.T2I_image_and_plain_msg(event, lambda: self.gokfun.zhanji(names[0], option))
+        # 多人合并为一张对比图
+        return await self.T2I_image_msg(event, lambda: self.gokfun.zhanji_multi(names, option))
     
     async def gok_ziliao(self, event: AstrMessageEvent,name: str):
         """王者资料"""
-        return await self.T2I_image_msg(event, lambda: self.gokfun.ziliao(name))
+        return await self.image_msg(event, lambda: self.gokfun.ziliao(name))
     
     async def gok_zhanli(self, event: AstrMessageEvent, hero: str, type: str = "aqq"):
         """英雄战力 名称 大区"""
         return await self.plain_msg(event, lambda: self.gokfun.zhanli(hero,type))
     
+    async def gok_zhanli_rank(self, event: AstrMessageEvent, *args: str):
+        """战力排行 大区 省/市/区 数量，参数顺序不限"""
+        params = {}
+        for arg in args:
+            if arg.isdigit():
+                params["limit"] = int(arg)
+            elif arg in ("省", "市", "区"):
+                params["level"] = arg
+            else:
+                params["type"] = arg
+        return await self.plain_msg(event, lambda: self.gokfun.zhanli_rank(**params))
+    
+    async def gok_leaderboard(self, event: AstrMessageEvent, *args: str):
+        """排行榜 胜率/KDA/评分/积分 模式，参数顺序不限"""
+        sort = "胜率"
+        option = "0"
+        for arg in args:
+            if arg.isdigit():
+                option = arg
+            else:
+                sort = arg
+
+        # 统计超过几秒时先回复一次进度，避免群友以为没有响应
+        start = time.monotonic()
+        notified = False
+
+        async def progress(done: int, total: int):
+            nonlocal notified
+            if not notified and done < total and time.monotonic() - start > 3:
+                notified = True
+                await self.send_result(event, event.plain_result(f"排行榜统计中，已完成 {done}/{total}，请稍候"))
+
+        return await self.T2I_image_msg(event, lambda: self.gokfun.leaderboard(sort, option, progress))
+    
+    def users_write(self, action):
+        """角色数据写入完成后再清除角色列表的渲染缓存，避免写入期间的渲染把旧数据写回缓存"""
+        async def run():
+            try:
+                return await action()
+            finally:
+                self.render_cache.invalidate("users")
+        return run
+
+
     async def gok_user_all(self, event: AstrMessageEvent):
         """角色查看"""
         return await self.T2I_image_msg(event, self.gokfun.all)
     
     async def gok_user_add(self, event: AstrMessageEvent, gokid: int, name: str):
         """角色添加 王者营地ID 名称"""
-        return await self.plain_msg(event, lambda: self.gokfun.add(gokid,name))
+        return await self.plain_msg(event, self.users_write(lambda: self.gokfun.add(gokid,name)))
     
     async def gok_user_update(self, event: AstrMessageEvent, gokid: int, name: str):
         """角色修改 王者营地ID 名称"""
-        return await self.plain_msg(event, lambda: self.gokfun.update(gokid,name))
+        return await self.plain_msg(event, self.users_write(lambda: self.gokfun.update(gokid,name)))
     
     async def gok_user_delete(self, event: AstrMessageEvent, gokid:int):
         """角色删除 王者营地ID"""
-        return await self.plain_msg(event, lambda: self.gokfun.delete(gokid))
+        return await self.plain_msg(event, self.users_write(lambda: self.gokfun.delete(gokid)))
+    
+    async def gok_user_import(self, event: AstrMessageEvent, *items: str):
+        """角色导入 营地ID 名称 ...（或附带 CSV/JSON 文件）"""
+        contents = ["\n".join(items)] if items else []
+        contents += await self.read_attachments(event)
+        return await self.plain_msg(event, self.users_write(lambda: self.gokfun.import_users(contents)))
+    
+    async def gok_metrics(self, event: AstrMessageEvent, action: str = ""):
+        """性能统计（管理员），性能统计 重置 清空数据"""
+        if not event.is_admin():
+            await self.send_result(event, event.plain_result("该指令仅管理员可用"))
+            return
+        if not metrics.enabled:
+            await self.send_result(event, event.plain_result("未启用性能统计，请在插件配置中开启"))
+            return
+        if action == "重置":
+            metrics.reset()
+            await self.send_result(event, event.plain_result("性能统计已重置"))
+            return
+        report = metrics.report()
+        prefetch = self.gokfun.prefetch_report()
+        if prefetch:
+            report += "\n" + prefetch
+        await self.send_result(event, event.plain_result(report))
     
     async def gok_user_select(self, event: AstrMessageEvent, gokid):
         """角色查询 王者营地ID"""